@@ -0,0 +1,325 @@
+"""
+Bighead Micro-Benchmarks
+
+Times the per-call cost of SDK and plugin hot paths on fixed synthetic
+inputs, and compares the results against a stored baseline so performance
+regressions fail loudly.
+
+Usage:
+    python benchmarks/bench.py                 # Run and compare with baseline
+    python benchmarks/bench.py --save          # Run and store as this host's baseline
+    python benchmarks/bench.py -k matcher      # Only benchmarks containing "matcher"
+    python benchmarks/bench.py --require-baseline  # Fail instead of passing without a baseline
+
+Baselines are stored per host in benchmarks/baseline.json, since timings
+are only comparable on the same machine. The exit code is 1 when any
+benchmark is slower than its baseline by more than --tolerance, or, with
+--require-baseline, when any benchmark has no baseline for this host.
+
+Dependencies:
+    pip install numpy pyserial
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "python"))
+sys.path.insert(0, str(ROOT / "plugins" / "fivem-voice"))
+
+import numpy as np
+import serial
+
+from bighead import Bighead, READ_POLL_INTERVAL
+from config_loader import DEFAULTS, deep_merge, load_config
+from keyword_matcher import KeywordMatcher
+from stt import SAMPLE_RATE, RealtimeSTT, pcm16_to_float32
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+# Input scales
+TRIGGER_COUNTS = [10, 100, 1000, 10000]
+KEY_COUNTS = [10, 100, 1000, 10000]
+BUFFER_MS = [20, 100, 500, 2000]
+TEXT_LENGTHS = [10, 100, 250]
+
+# Each repeat runs for at least this long; the fastest repeat is reported
+MIN_REPEAT_TIME = 0.05
+REPEATS = 5
+
+# Fixed seed so synthetic inputs are identical on every run
+SEED = 1234
+
+# Holds generated config files; removed when the process exits
+_TEMP_DIR = tempfile.TemporaryDirectory(prefix="bighead-bench-")
+
+
+def make_keyword_config(n_triggers, triggers_per_group=4):
+    """Synthetic keyword_triggers config with n_triggers trigger words."""
+    groups = []
+    for start in range(0, n_triggers, triggers_per_group):
+        stop = min(start + triggers_per_group, n_triggers)
+        groups.append({
+            "triggers": [f"trigger{i}" for i in range(start, stop)],
+            "emotes": [f"emote{start}", f"emote{start}b"],
+        })
+    return {"cooldown": 0.0, "groups": groups}
+
+
+def make_nested_config(n_keys, value, fanout=10):
+    """Nested dicts with n_keys leaves and at most fanout entries per level."""
+    if n_keys <= fanout:
+        return {f"key{i}": value for i in range(n_keys)}
+    per_section = -(-n_keys // fanout)
+    return {
+        f"section{i}": make_nested_config(min(per_section, n_keys - start), value, fanout)
+        for i, start in enumerate(range(0, n_keys, per_section))
+    }
+
+
+def make_utterance(n_triggers, rng):
+    """Typical transcript: a dozen words, one of them a trigger near the end."""
+    words = [f"filler{rng.randrange(1000)}," for _ in range(11)]
+    words.append(f"trigger{rng.randrange(n_triggers)}!")
+    return " ".join(words)
+
+
+class _NullModel:
+    """Stands in for Whisper so only buffer management is timed."""
+
+    def transcribe(self, audio, **kwargs):
+        return [], None
+
+
+def bench_keyword_matcher():
+    """KeywordMatcher.match against configs of increasing size."""
+    for n in TRIGGER_COUNTS:
+        rng = random.Random(SEED)
+        matcher = KeywordMatcher(make_keyword_config(n))
+        texts = [make_utterance(n, rng) for _ in range(64)]
+
+        def run(matcher=matcher, texts=texts):
+            for text in texts:
+                matcher.match(text)
+
+        yield f"keyword_matcher.match[{n}_triggers]", run, len(texts)
+
+
+def bench_pcm_conversion():
+    """int16 -> float32 conversion done in AudioCapture's callback."""
+    rng = np.random.default_rng(SEED)
+    for ms in BUFFER_MS:
+        samples = SAMPLE_RATE * ms // 1000
+        data = rng.integers(-32768, 32767, samples, dtype=np.int16).tobytes()
+
+        def run(data=data):
+            pcm16_to_float32(data)
+
+        yield f"audio.pcm16_to_float32[{ms}ms]", run, 1
+
+
+def bench_stt_buffering():
+    """RealtimeSTT worker buffer management, with a no-op model."""
+    rng = np.random.default_rng(SEED)
+    for ms in BUFFER_MS:
+        samples = SAMPLE_RATE * ms // 1000
+        chunk = rng.uniform(-1, 1, samples).astype(np.float32)
+        stt = RealtimeSTT()
+        stt.model = _NullModel()
+        chunks_per_run = max(1, 4000 // ms)  # About 4s of audio per run
+
+        def run(stt=stt, chunk=chunk, n=chunks_per_run):
+            buffer = np.array([], dtype=np.float32)
+            for _ in range(n):
+                buffer = stt._process(buffer, chunk, 0.0)
+
+        yield f"stt.worker_buffer[{ms}ms_chunks]", run, chunks_per_run
+
+
+def bench_bighead_send():
+    """Bighead.send command encoding and response parsing over loop://."""
+    for length in TEXT_LENGTHS:
+        bh = Bighead(port="loop://")
+        bh.ser = serial.serial_for_url("loop://", timeout=READ_POLL_INTERVAL)
+        content = ("abcdefghij" * (length // 10 + 1))[:length]
+
+        def run(bh=bh, content=content):
+            bh.send(f"TEXT:{content}")  # loop:// echoes the command as the response
+
+        yield f"bighead.send[text_{length}]", run, 1
+
+
+def bench_config():
+    """deep_merge and load_config on configs of increasing size."""
+    # Lists are replaced wholesale, so deep_merge cost grows with nested dicts
+    # present in both the base and the override, not with trigger counts
+    for n in KEY_COUNTS:
+        base = deep_merge(DEFAULTS, {"plugins": make_nested_config(n, 0)})
+        override = {"plugins": make_nested_config(n, 1)}
+
+        def merge(base=base, override=override):
+            deep_merge(base, override)
+
+        yield f"config.deep_merge[{n}_keys]", merge, 1
+
+    for n in TRIGGER_COUNTS:
+        user_config = {"toggle_word": "toggle", "keyword_triggers": make_keyword_config(n)}
+        path = os.path.join(_TEMP_DIR.name, f"config_{n}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(user_config, f)
+
+        def load(path=path):
+            load_config(path)
+
+        yield f"config.load_config[{n}_triggers]", load, 1
+
+
+BENCHMARKS = [
+    bench_keyword_matcher,
+    bench_pcm_conversion,
+    bench_stt_buffering,
+    bench_bighead_send,
+    bench_config,
+]
+
+
+def measure(func, ops_per_call):
+    """
+    Time a benchmark callable.
+
+    Returns:
+        Dict with best and median nanoseconds per operation
+    """
+    func()  # Warm up
+
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_REPEAT_TIME:
+            break
+        loops *= 2
+
+    timings = [elapsed]
+    for _ in range(REPEATS - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        timings.append(time.perf_counter() - start)
+
+    per_op = [t / (loops * ops_per_call) * 1e9 for t in timings]
+    return {"best_ns": min(per_op), "median_ns": statistics.median(per_op)}
+
+
+def load_baselines():
+    """Read all stored baselines, keyed by host."""
+    if BASELINE_PATH.exists():
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def host_key():
+    """Identify this machine and Python build for baseline lookup."""
+    return f"{socket.gethostname()}/{platform.python_implementation()}-{platform.python_version()}"
+
+
+def format_ns(ns):
+    """Human-readable duration."""
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f}ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.2f}us"
+    return f"{ns:.0f}ns"
+
+
+def main():
+    """Entry point."""
+    parser = argparse.ArgumentParser(description="Run Bighead micro-benchmarks")
+    parser.add_argument("-k", dest="filter", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--save", action="store_true", help="Store results as this host's baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown vs baseline before failing (default 0.25 = 25%%)")
+    parser.add_argument("--json", metavar="PATH", help="Also write results to this file")
+    parser.add_argument("--require-baseline", action="store_true",
+                        help="Fail when a benchmark has no baseline for this host")
+    args = parser.parse_args()
+
+    baselines = load_baselines()
+    host = host_key()
+    baseline = baselines.get(host, {}).get("results", {})
+
+    print(f"Host: {host}")
+    if not baseline and not args.save:
+        print("No baseline for this host; run with --save to create one.")
+    print(f"\n{'benchmark':44} {'best':>10} {'median':>10} {'baseline':>10} {'change':>8}")
+    print("-" * 86)
+
+    results = {}
+    regressions = []
+    for bench in BENCHMARKS:
+        for name, func, ops in bench():
+            if args.filter and args.filter not in name:
+                continue
+            result = measure(func, ops)
+            results[name] = result
+
+            base = baseline.get(name)
+            change = ""
+            if base:
+                ratio = result["best_ns"] / base["best_ns"] - 1
+                change = f"{ratio:+.0%}"
+                if ratio > args.tolerance:
+                    regressions.append(name)
+                    change += " !"
+            print(f"{name:44} {format_ns(result['best_ns']):>10} "
+                  f"{format_ns(result['median_ns']):>10} "
+                  f"{format_ns(base['best_ns']) if base else '-':>10} {change:>8}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"host": host, "results": results}, f, indent=2)
+
+    if args.save:
+        merged = dict(baseline)
+        merged.update(results)
+        baselines[host] = {"saved": time.strftime("%Y-%m-%d %H:%M:%S"), "results": merged}
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"\nSaved baseline for {host} to {BASELINE_PATH}")
+        return 0
+
+    failed = False
+    if regressions:
+        print(f"\nFAIL: {len(regressions)} benchmark(s) slower than baseline "
+              f"by more than {args.tolerance:.0%}:")
+        for name in regressions:
+            print(f"  {name}")
+        failed = True
+
+    missing = [name for name in results if name not in baseline]
+    if missing and args.require_baseline:
+        print(f"\nFAIL: {len(missing)} benchmark(s) have no baseline for {host}:")
+        for name in missing:
+            print(f"  {name}")
+        failed = True
+    if failed:
+        return 1
+
+    print("\nOK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
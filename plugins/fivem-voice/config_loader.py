@@ -10,6 +10,29 @@ import os
 # Default configuration (used when config.json is missing or incomplete)
 DEFAULTS = {
     "toggle_word": "toggle",
+    "connection": {
+        "supervised": True,
+        "max_age": 1.0,
+        "stale_policy": "drop",
+    },
+    "stt": {
+        "model_size": "base",
+        "max_backlog": 3.0,
+        "overload_policy": "live_edge",
+        "overload_threshold": 1.0,
+        "max_result_age": 2.0,
+    },
+    "delivery": {
+        "strategy": "auto",
+        "restore_clipboard": True,
+        "use_macros": False,
+    },
+    "speculation": {
+        "enabled": False,
+        "draft_model": "tiny",
+        "threshold": 0.5,
+        "timeout": 1.5,
+    },
     "keyword_triggers": {
         "cooldown": 3.0,
         "groups": [
@@ -61,6 +84,26 @@ def load_config(path: str = None) -> dict:
     return config
 
 
+def get_connection_config(config: dict) -> dict:
+    """Extract ESP32 connection config."""
+    return config.get("connection", DEFAULTS["connection"])
+
+
+def get_stt_config(config: dict) -> dict:
+    """Extract speech-to-text config."""
+    return config.get("stt", DEFAULTS["stt"])
+
+
+def get_delivery_config(config: dict) -> dict:
+    """Extract slash command delivery config."""
+    return config.get("delivery", DEFAULTS["delivery"])
+
+
+def get_speculation_config(config: dict) -> dict:
+    """Extract speculative emote config."""
+    return config.get("speculation", DEFAULTS["speculation"])
+
+
 def get_keyword_config(config: dict) -> dict:
     """Extract keyword triggers config."""
     return config.get("keyword_triggers", DEFAULTS["keyword_triggers"])
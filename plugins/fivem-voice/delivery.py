@@ -0,0 +1,302 @@
+"""
+Slash command delivery strategies.
+
+Once the FiveM console is open, the command text has to get into it. Each
+strategy does this differently:
+- clipboard: pyperclip.copy + Ctrl+V (spawns xclip/xsel per call on Linux)
+- owner:     a persistent in-process clipboard owner (hidden Tk window) + Ctrl+V,
+             optionally restoring the user's clipboard afterwards
+- text:      type the command with the device's TEXT command (clipboard untouched)
+
+DeliverySelector measures what each strategy costs on this host for each
+command length and picks the cheapest, or uses a fixed strategy from config.
+"""
+
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from typing import Optional
+
+import pyperclip
+
+STRATEGIES = ("clipboard", "owner", "text")
+
+# Command length buckets costs are tracked in (upper bounds, inclusive)
+LENGTH_BUCKETS = (16, 32, 64, 128)
+
+# Measurements per strategy and bucket before auto selection trusts them
+MIN_SAMPLES = 3
+
+# Weight of the newest measurement in the running average
+EWMA_ALPHA = 0.3
+
+
+class ClipboardOwner:
+    """
+    Owns the clipboard from a hidden Tk window on a background thread.
+
+    Setting the clipboard is an in-process call instead of a subprocess, and
+    the content stays available for pasting as long as the process lives.
+    There is one owner per process (see shared()): a Tk interpreter must be
+    freed on the thread that created it, so the owner is never torn down.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> "ClipboardOwner":
+        """
+        Get the process-wide owner, starting it on first use.
+
+        Raises:
+            RuntimeError: If Tk is unavailable (no tkinter or no display)
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def __init__(self, poll_interval_ms: int = 50):
+        """
+        Start the owner thread.
+
+        Args:
+            poll_interval_ms: How often the Tk thread checks for new content
+                              when Tcl lacks thread support (otherwise each
+                              copy wakes it directly and it never polls)
+
+        Raises:
+            RuntimeError: If Tk is unavailable (no tkinter or no display)
+        """
+        self.poll_interval_ms = poll_interval_ms
+        self._requests = queue.Queue()
+        self._ready = threading.Event()
+        self._error = None
+        self._root = None
+        self._threaded = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+        if self._error is not None:
+            raise RuntimeError(f"Clipboard owner unavailable: {self._error}")
+
+    def _run(self):
+        """Tk main loop; all Tk calls happen on this thread."""
+        try:
+            import tkinter
+            root = tkinter.Tk()
+            root.withdraw()
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._root = root
+        # Threaded Tcl runs calls from other threads on this one, so copy()
+        # can schedule the drain itself instead of this thread polling
+        self._threaded = bool(root.tk.call("info", "exists", "tcl_platform(threaded)"))
+        self._ready.set()
+
+        def poll():
+            self._drain()
+            root.after(self.poll_interval_ms, poll)
+
+        if not self._threaded:
+            root.after(self.poll_interval_ms, poll)
+        root.mainloop()
+
+    def _drain(self):
+        """Apply queued clipboard requests (runs on the Tk thread)."""
+        import tkinter
+        while True:
+            try:
+                text, result, done = self._requests.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                result.append(self._root.clipboard_get())
+            except tkinter.TclError:
+                result.append(None)  # Empty or non-text clipboard
+            self._root.clipboard_clear()
+            self._root.clipboard_append(text)
+            self._root.update()
+            done.set()
+
+    def copy(self, text: str) -> Optional[str]:
+        """
+        Put text on the clipboard.
+
+        Returns:
+            The previous clipboard text, or None if it held no text
+        """
+        result = []
+        done = threading.Event()
+        self._requests.put((text, result, done))
+        if self._threaded:
+            self._root.after_idle(self._drain)
+        done.wait(timeout=1)
+        return result[0] if result else None
+
+
+class ClipboardStrategy:
+    """Copy with pyperclip, paste with Ctrl+V."""
+
+    name = "clipboard"
+
+    def prepare(self, command: str):
+        """Host-side work done before the console opens."""
+        pyperclip.copy(command)
+
+    def deliver(self, bighead, command: str):
+        """Get the command into the open console."""
+        # Ctrl+V to paste
+        bighead.press("CTRL")
+        time.sleep(0.02)
+        bighead.key("V")
+        time.sleep(0.02)
+        bighead.release("CTRL")
+        time.sleep(0.03)
+
+    def restore(self):
+        """Undo host-side side effects after the command is submitted or cancelled."""
+
+
+class OwnerStrategy(ClipboardStrategy):
+    """Copy via a persistent clipboard owner, paste with Ctrl+V."""
+
+    name = "owner"
+
+    def __init__(self, restore_clipboard: bool = True):
+        self.restore_clipboard = restore_clipboard
+        self._owner = ClipboardOwner.shared()  # Fails here if Tk is unavailable
+        self._previous = None
+
+    def prepare(self, command: str):
+        self._previous = self._owner.copy(command)
+
+    def restore(self):
+        if self.restore_clipboard and self._previous is not None:
+            self._owner.copy(self._previous)
+        self._previous = None
+
+
+class TextStrategy(ClipboardStrategy):
+    """Type the command on the device; the clipboard is never touched."""
+
+    name = "text"
+
+    def prepare(self, command: str):
+        pass
+
+    def deliver(self, bighead, command: str):
+        bighead.text(command)
+
+
+def _bucket(length: int) -> str:
+    """Name of the length bucket a command falls in."""
+    for upper in LENGTH_BUCKETS:
+        if length <= upper:
+            return str(upper)
+    return "max"
+
+
+class DeliverySelector:
+    """
+    Chooses a delivery strategy, fixed or by measured cost.
+
+    In "auto" mode every available strategy is tried MIN_SAMPLES times per
+    length bucket, then the one with the lowest running-average cost wins.
+    Costs are saved per host, so later sessions start with what was learned.
+    """
+
+    def __init__(self, strategy: str = "auto", cost_path: str = None,
+                 restore_clipboard: bool = True):
+        """
+        Initialize the selector.
+
+        Args:
+            strategy: "auto" or one of STRATEGIES
+            cost_path: JSON file for learned costs (None to keep them in memory)
+            restore_clipboard: Let the owner strategy put the user's clipboard back
+        """
+        if strategy != "auto" and strategy not in STRATEGIES:
+            raise ValueError(f"strategy must be 'auto' or one of {STRATEGIES}")
+        self.mode = strategy
+        self.cost_path = cost_path
+        self._host = socket.gethostname()
+        self._costs = {}  # strategy -> bucket -> {"mean": seconds, "samples": n}
+
+        self.strategies = {"clipboard": ClipboardStrategy(), "text": TextStrategy()}
+        if strategy in ("auto", "owner"):
+            try:
+                self.strategies["owner"] = OwnerStrategy(restore_clipboard)
+            except RuntimeError as e:
+                if strategy == "owner":
+                    raise
+                print(f"[Delivery] {e}; not using the owner strategy")
+
+        self.load()
+
+    def choose(self, length: int) -> ClipboardStrategy:
+        """Pick the strategy for a command of the given length."""
+        if self.mode != "auto":
+            return self.strategies[self.mode]
+
+        bucket = _bucket(length)
+        for name in STRATEGIES:
+            if name in self.strategies and self._samples(name, bucket) < MIN_SAMPLES:
+                return self.strategies[name]
+        name = min((n for n in STRATEGIES if n in self.strategies),
+                   key=lambda n: self._costs[n][bucket]["mean"])
+        return self.strategies[name]
+
+    def _samples(self, name: str, bucket: str) -> int:
+        return self._costs.get(name, {}).get(bucket, {}).get("samples", 0)
+
+    def record(self, strategy: ClipboardStrategy, length: int, seconds: float):
+        """Add a measured delivery cost."""
+        entry = self._costs.setdefault(strategy.name, {}).setdefault(
+            _bucket(length), {"mean": seconds, "samples": 0})
+        entry["mean"] += EWMA_ALPHA * (seconds - entry["mean"])
+        entry["samples"] += 1
+
+    def costs(self) -> dict:
+        """Measured mean cost in milliseconds, by strategy and length bucket."""
+        return {
+            name: {bucket: round(e["mean"] * 1000, 1) for bucket, e in buckets.items()}
+            for name, buckets in self._costs.items()
+        }
+
+    def load(self):
+        """Read this host's learned costs."""
+        if not self.cost_path or not os.path.exists(self.cost_path):
+            return
+        try:
+            with open(self.cost_path, "r", encoding="utf-8") as f:
+                self._costs = json.load(f).get(self._host, {})
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Warning: Could not load {self.cost_path}: {e}")
+
+    def save(self):
+        """Write this host's learned costs, keeping other hosts' entries."""
+        if not self.cost_path:
+            return
+        data = {}
+        if os.path.exists(self.cost_path):
+            try:
+                with open(self.cost_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, IOError):
+                pass
+        data[self._host] = self._costs
+        with open(self.cost_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+    def close(self):
+        """Save costs and undo any pending clipboard change."""
+        self.save()
+        for strategy in self.strategies.values():
+            strategy.restore()
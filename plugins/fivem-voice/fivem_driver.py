@@ -10,15 +10,25 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent / "python"))
 
 import time
-import pyperclip
 
+import macros
 from bighead import Bighead
+from supervisor import SupervisedBighead
+from delivery import DeliverySelector
+
+# Seconds for the FiveM chat console to open after T is released
+CONSOLE_OPEN_DELAY = 0.15
+
+# RUN responses meaning the macro never played, so host delivery is safe
+MACRO_MISSING = ("ERROR:UNKNOWN_MACRO", "ERROR:UNKNOWN_COMMAND")
 
 
 class FiveMDriver:
     """Driver for sending slash commands to FiveM."""
 
-    def __init__(self, bighead=None, port=None, baud=115200):
+    def __init__(self, bighead=None, port=None, baud=115200, supervised=False,
+                 max_age=1.0, stale_policy="drop", strategy="auto", cost_path=None,
+                 restore_clipboard=True):
         """
         Initialize FiveM driver.
 
@@ -26,11 +36,23 @@ class FiveMDriver:
             bighead: Existing Bighead connection (optional)
             port: Serial port if creating new connection (auto-detected if None)
             baud: Baud rate if creating new connection
+            supervised: Reconnect automatically if the device drops out
+            max_age: Seconds a command buffered during a dropout stays fresh
+            stale_policy: What to do with buffered commands ("drop", "replay", "fail")
+            strategy: How commands reach the console ("auto", "clipboard", "owner", "text")
+            cost_path: JSON file where measured delivery costs are kept per host
+            restore_clipboard: Restore the user's clipboard after the owner strategy
         """
         self._owns_connection = bighead is None
         self._bighead = bighead
         self._port = port
         self._baud = baud
+        self._supervised = supervised
+        self._max_age = max_age
+        self._stale_policy = stale_policy
+        self._staged = None
+        self._macros = {}  # Command -> id of the device macro that plays it
+        self.delivery = DeliverySelector(strategy, cost_path, restore_clipboard)
 
     @property
     def bighead(self):
@@ -40,50 +62,154 @@ class FiveMDriver:
     def connect(self):
         """Connect to the ESP32 BLE keyboard."""
         if self._owns_connection:
-            self._bighead = Bighead(self._port, self._baud)
+            if self._supervised:
+                self._bighead = SupervisedBighead(
+                    self._port, self._baud,
+                    max_age=self._max_age, stale_policy=self._stale_policy,
+                )
+            else:
+                self._bighead = Bighead(self._port, self._baud)
             self._bighead.connect()
         return self
 
     def disconnect(self):
         """Disconnect if we own the connection."""
+        self.delivery.close()
         if self._owns_connection and self._bighead:
             self._bighead.disconnect()
             self._bighead = None
 
-    def slash(self, command):
+    @property
+    def staged(self):
+        """The command waiting in an open console, or None."""
+        return self._staged[0] if self._staged else None
+
+    def stage(self, command):
         """
-        Send a slash command to FiveM.
+        Prepare a slash command without submitting it.
+
+        Does the host-side part of delivery (e.g., filling the clipboard) and
+        opens the console, so a later commit() only has to paste or type and
+        submit. Call rollback() to cancel.
 
         Args:
-            command: The command without leading slash (e.g., "e dance3" or "sit")
-                     Can also include the slash (e.g., "/e dance3")
+            command: The command without leading slash (e.g., "e dance3")
         """
         # Normalize: ensure it starts with /
         if not command.startswith("/"):
             command = "/" + command
 
-        # Copy to clipboard
-        pyperclip.copy(command)
+        strategy = self.delivery.choose(len(command))
+        start = time.monotonic()
+        strategy.prepare(command)
+        prepare_time = time.monotonic() - start
 
         # Press T to open console
         self._bighead.press("T")
         time.sleep(0.05)
         self._bighead.release("T")
-        time.sleep(0.15)  # Wait for console to open
-
-        # Ctrl+V to paste
-        self._bighead.press("CTRL")
-        time.sleep(0.02)
-        self._bighead.key("V")
-        time.sleep(0.02)
-        self._bighead.release("CTRL")
-        time.sleep(0.03)
+        self._staged = (command, time.monotonic(), strategy, prepare_time)
+
+    def commit(self):
+        """Paste and submit the staged command."""
+        command, opened_at, strategy, prepare_time = self._staged
+        self._staged = None
+
+        # Wait for console to open, counting time already spent since staging
+        remaining = CONSOLE_OPEN_DELAY - (time.monotonic() - opened_at)
+        if remaining > 0:
+            time.sleep(remaining)
+
+        start = time.monotonic()
+        strategy.deliver(self._bighead, command)
+        deliver_time = time.monotonic() - start
 
         # Enter to submit
         self._bighead.key("ENTER")
         time.sleep(0.03)
         self._bighead.release_all()
 
+        # Restoring the clipboard blocks the caller too, so it is part of the cost
+        start = time.monotonic()
+        strategy.restore()
+        self.delivery.record(strategy, len(command),
+                             prepare_time + deliver_time + time.monotonic() - start)
+
+    def rollback(self):
+        """Close the console opened by stage() without submitting."""
+        strategy = self._staged[2] if self._staged else None
+        self._staged = None
+        self._bighead.key("ESC")
+        self._bighead.release_all()
+        if strategy:
+            strategy.restore()
+
+    @staticmethod
+    def macro_steps(command):
+        """Macro steps that open the console, type the command, and submit it."""
+        return [
+            ("press", "T"),
+            ("wait", 50),
+            ("release", "T"),
+            ("wait", int(CONSOLE_OPEN_DELAY * 1000)),
+            ("text", command),
+            ("key", "ENTER"),
+            ("wait", 30),
+        ]
+
+    def install_macros(self, commands):
+        """
+        Store a device macro for each command so slash() plays it with one RUN.
+
+        Macros already on the device with the same body are not re-uploaded.
+
+        Args:
+            commands: Commands without leading slash (e.g., ["e dance3", "e sit"])
+
+        Returns:
+            Number of commands with a macro on the device
+        """
+        for command in commands:
+            if not command.startswith("/"):
+                command = "/" + command
+            steps = self.macro_steps(command)
+            macro_id = "E" + macros.macro_hash(command).upper()
+            try:
+                if not self._bighead.verify_macro(macro_id, steps):
+                    response = self._bighead.upload_macro(macro_id, steps)
+                    if response != "OK:MACRO_SAVED":
+                        print(f"[FiveM] Could not store macro for {command}: {response}")
+                        continue
+            except ValueError as e:
+                print(f"[FiveM] Could not store macro for {command}: {e}")
+                continue
+            self._macros[command] = macro_id
+        return len(self._macros)
+
+    def slash(self, command):
+        """
+        Send a slash command to FiveM.
+
+        Uses the command's device macro when one was installed, otherwise
+        stages and commits it from the host. Host delivery is only a fallback
+        for a macro the device doesn't have: after any other response (e.g. a
+        timeout) the macro may already have played.
+
+        Args:
+            command: The command without leading slash (e.g., "e dance3" or "sit")
+                     Can also include the slash (e.g., "/e dance3")
+        """
+        if not command.startswith("/"):
+            command = "/" + command
+        macro_id = self._macros.get(command)
+        if macro_id:
+            response = self._bighead.run_macro(macro_id)
+            if response not in MACRO_MISSING:
+                return
+            del self._macros[command]  # Deleted, or firmware without macros
+        self.stage(command)
+        self.commit()
+
     def emote(self, name):
         """
         Shortcut for emote commands.
@@ -46,15 +46,15 @@ class KeywordMatcher:
         # Track last trigger time per group
         self._last_trigger = {}
 
-    def match(self, text: str) -> Optional[str]:
+    def peek(self, text: str) -> Optional[int]:
         """
-        Check text for keyword triggers.
+        Find the first triggered group without starting its cooldown.
 
         Args:
             text: Transcribed text to scan
 
         Returns:
-            Emote name if triggered, None otherwise
+            Group index if a trigger off cooldown is found, None otherwise
         """
         now = time.time()
         text_lower = text.lower()
@@ -69,12 +69,33 @@ class KeywordMatcher:
 
                 # Check cooldown
                 last_time = self._last_trigger.get(group_idx, 0)
-                if (now - last_time) >= self.cooldown:
-                    # Cooldown elapsed, trigger emote
-                    self._last_trigger[group_idx] = now
-                    emotes = self._group_emotes[group_idx]
-                    if emotes:
-                        emote = random.choice(emotes)
-                        return emote
+                if (now - last_time) >= self.cooldown and self._group_emotes[group_idx]:
+                    return group_idx
 
         return None
+
+    def choose(self, group_idx: int) -> str:
+        """Pick a random emote from a group."""
+        return random.choice(self._group_emotes[group_idx])
+
+    def consume(self, group_idx: int):
+        """Start the cooldown for a group that was triggered."""
+        self._last_trigger[group_idx] = time.time()
+
+    def match(self, text: str) -> Optional[str]:
+        """
+        Check text for keyword triggers.
+
+        Args:
+            text: Transcribed text to scan
+
+        Returns:
+            Emote name if triggered, None otherwise
+        """
+        group_idx = self.peek(text)
+        if group_idx is None:
+            return None
+
+        # Cooldown elapsed, trigger emote
+        self.consume(group_idx)
+        return self.choose(group_idx)
@@ -9,13 +9,18 @@ Usage:
     python main.py --test    # Test mode without ESP32 connection
 """
 
+import os
 import sys
 import time
 
-from config_loader import load_config, get_keyword_config
-from stt import AudioCapture, RealtimeSTT
+from config_loader import (
+    load_config, get_connection_config, get_delivery_config, get_keyword_config,
+    get_speculation_config, get_stt_config,
+)
+from stt import AudioCapture, RealtimeSTT, is_smaller_model
 from keyword_matcher import KeywordMatcher
 from fivem_driver import FiveMDriver
+from speculation import SpeculativeEmoter
 
 
 class VoiceEmoteOrchestrator:
@@ -27,6 +32,7 @@ class VoiceEmoteOrchestrator:
     - RealtimeSTT: Speech-to-text transcription
     - KeywordMatcher: Keyword-to-emote matching
     - FiveMDriver: Emote execution via ESP32
+    - SpeculativeEmoter: Optional emote pre-staging from tentative transcripts
     """
 
     def __init__(self, config_path: str = None, test_mode: bool = False):
@@ -44,6 +50,7 @@ class VoiceEmoteOrchestrator:
         self.stt = None
         self.keyword_matcher = None
         self.audio_capture = None
+        self.speculator = None
 
         # Toggle state - when paused, keywords are ignored
         self._paused = True  # Start paused, say "toggle" to activate
@@ -65,16 +72,42 @@ class VoiceEmoteOrchestrator:
         # 1. Connect to ESP32 (unless in test mode)
         if not self.test_mode:
             print("\n[1/4] Connecting to ESP32...")
-            self.fivem = FiveMDriver()
+            connection = get_connection_config(self.config)
+            delivery = get_delivery_config(self.config)
+            self.fivem = FiveMDriver(
+                supervised=connection.get("supervised", True),
+                max_age=connection.get("max_age", 1.0),
+                stale_policy=connection.get("stale_policy", "drop"),
+                strategy=delivery.get("strategy", "auto"),
+                cost_path=os.path.join(os.path.dirname(__file__), "delivery_costs.json"),
+                restore_clipboard=delivery.get("restore_clipboard", True),
+            )
             self.fivem.connect()
             print(f"      Connected: {self.fivem.bighead.port}")
+            if delivery.get("use_macros", False):
+                emotes = {emote for group in get_keyword_config(self.config).get("groups", [])
+                          for emote in group.get("emotes", [])}
+                installed = self.fivem.install_macros(f"e {emote}" for emote in sorted(emotes))
+                print(f"      Device macros: {installed}/{len(emotes)} emotes")
         else:
             print("\n[1/4] Test mode - skipping ESP32 connection")
             self.fivem = None
 
         # 2. Initialize STT
         print("[2/4] Loading STT model (Whisper)...")
-        self.stt = RealtimeSTT(model_size="tiny")
+        stt_config = dict(get_stt_config(self.config))
+        speculation = get_speculation_config(self.config)
+        speculate = speculation.get("enabled", False) and self.fivem is not None
+        if speculate:
+            draft = speculation.get("draft_model", "tiny")
+            main_model = stt_config.get("model_size", "base")
+            if is_smaller_model(draft, main_model):
+                stt_config["draft_model_size"] = draft
+            else:
+                print(f"      Speculation disabled: draft model '{draft}' must be smaller "
+                      f"than stt.model_size '{main_model}'")
+                speculate = False
+        self.stt = RealtimeSTT(**stt_config)
         self.stt.start()
 
         # 3. Initialize keyword matcher
@@ -86,6 +119,13 @@ class VoiceEmoteOrchestrator:
             triggers = ", ".join(group.get("triggers", []))
             emotes = ", ".join(group.get("emotes", []))
             print(f"      [{triggers}] -> [{emotes}]")
+        if speculate:
+            self.speculator = SpeculativeEmoter(
+                self.fivem, self.keyword_matcher,
+                threshold=speculation.get("threshold", 0.5),
+                timeout=speculation.get("timeout", 1.5),
+            )
+            print(f"      Speculative staging on (threshold {self.speculator.threshold})")
 
         # 4. Start audio capture (feeds STT)
         print("[4/4] Starting audio capture...")
@@ -103,19 +143,39 @@ class VoiceEmoteOrchestrator:
         print("System starts PAUSED - voice commands are ignored until toggled.")
         print("=" * 60 + "\n")
 
+    def _poll_partial(self):
+        """Stage emotes from tentative transcripts (speculation only)."""
+        partial = self.stt.get_partial()
+        if partial and not self._paused:
+            text, confidence = partial
+            self.speculator.on_partial(text, confidence)
+            if self.speculator.staged_emote:
+                print(f"[{time.time():.3f}] [STAGE] '{text}' ({confidence:.2f}) "
+                      f"-> /e {self.speculator.staged_emote}")
+        self.speculator.expire()
+
     def run(self):
         """Run the main loop (blocks until interrupted)."""
+        # Poll quickly while speculating so tentative results are staged at once
+        poll_timeout = 0.01 if self.speculator else 0.1
         try:
             while True:
-                # Poll STT for transcriptions
-                result = self.stt.get(timeout=0.1)
-                if result:
+                try:
+                    if self.speculator:
+                        self._poll_partial()
+
+                    # Poll STT for transcriptions
+                    result = self.stt.get(timeout=poll_timeout)
+                    if not result:
+                        continue
                     text, latency = result
                     text_lower = text.lower()
 
                     # Check for toggle word (always active, even when paused)
                     if self._toggle_word in text_lower:
                         print(f"[{time.time():.3f}] [STT] '{text}' ({latency*1000:.0f}ms)")
+                        if self.speculator:
+                            self.speculator.cancel()
                         self._toggle()
                         continue
 
@@ -124,12 +184,17 @@ class VoiceEmoteOrchestrator:
                         continue
 
                     # Check for keyword triggers
-                    emote = self.keyword_matcher.match(text)
+                    if self.speculator:
+                        emote = self.speculator.on_final(text)  # Plays or rolls back
+                    else:
+                        emote = self.keyword_matcher.match(text)
                     if emote:
                         print(f"[{time.time():.3f}] [STT] '{text}' ({latency*1000:.0f}ms)")
                         print(f"[{time.time():.3f}] [KEYWORD] -> /e {emote}")
-                        if self.fivem:
+                        if self.fivem and not self.speculator:
                             self.fivem.emote(emote)
+                except ConnectionError as e:
+                    print(f"[{time.time():.3f}] [DEVICE] Emote dropped: {e}")
         except KeyboardInterrupt:
             print("\n\nShutting down...")
 
@@ -139,7 +204,27 @@ class VoiceEmoteOrchestrator:
             self.audio_capture.stop()
         if self.stt:
             self.stt.stop()
+            s = self.stt.stats()
+            if s["dropped_audio_seconds"] or s["dropped_results"]:
+                print(f"STT overload: dropped {s['dropped_audio_seconds']:.1f}s audio, "
+                      f"{s['dropped_results']} late results, {s['skips']} skips "
+                      f"(model: {s['model_size']})")
+        if self.speculator:
+            s = self.speculator.stats()
+            if s["hit_rate"] is not None:
+                print(f"Speculation: {s['hits']} hits, {s['misses']} misses, "
+                      f"{s['expired']} expired (hit rate {s['hit_rate']:.0%})")
         if self.fivem:
+            costs = self.fivem.delivery.costs()
+            if costs:
+                print(f"Delivery cost (ms by command length): {costs}")
+            bighead = self.fivem.bighead
+            if hasattr(bighead, "metrics"):
+                m = bighead.metrics()
+                if m["reconnects"]:
+                    print(f"Device dropouts: {m['disconnects']}, "
+                          f"last recovery {m['last_recovery_ms']:.0f}ms, "
+                          f"dropped {m['dropped']} commands")
             self.fivem.disconnect()
         print("Goodbye!")
 
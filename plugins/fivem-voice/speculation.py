@@ -0,0 +1,167 @@
+"""
+Speculative emote pre-staging.
+
+Tentative transcripts from the STT draft model arrive before the final ones.
+When a tentative transcript contains a trigger, the emote is staged right
+away (clipboard filled, console opened), hiding the console-open delay
+behind the main model's recognition time. The final transcript then either
+confirms it (paste + submit) or it is rolled back (Escape + RELEASEALL).
+"""
+
+import time
+from collections import deque
+from typing import Optional
+
+from keyword_matcher import KeywordMatcher
+
+# Speculations kept for threshold tuning
+HISTORY_SIZE = 500
+
+# Thresholds evaluated in the tuning report
+CANDIDATE_THRESHOLDS = (0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+
+
+class SpeculativeEmoter:
+    """
+    Stages emotes from tentative transcripts and confirms them on final ones.
+
+    Tracks hits, misses and rollbacks, and the confidence of each
+    speculation, so the threshold can be tuned from real sessions.
+    """
+
+    def __init__(self, driver, matcher: KeywordMatcher, threshold: float = 0.5,
+                 timeout: float = 1.5):
+        """
+        Initialize the speculative emoter.
+
+        Args:
+            driver: FiveMDriver used to stage, commit and roll back
+            matcher: KeywordMatcher with the trigger configuration
+            threshold: Minimum tentative-transcript confidence (0-1) to stage
+            timeout: Seconds to wait for a final transcript before rolling back
+        """
+        self.driver = driver
+        self.matcher = matcher
+        self.threshold = threshold
+        self.timeout = timeout
+
+        self._staged = None  # (group_idx, emote, confidence, staged_at)
+        self._shadow = None  # (group_idx, confidence) of a below-threshold candidate
+        self._history = deque(maxlen=HISTORY_SIZE)  # (confidence, hit)
+        self._counts = {
+            "staged": 0,
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "below_threshold": 0,
+        }
+
+    @property
+    def staged_emote(self) -> Optional[str]:
+        """The emote currently staged, or None."""
+        return self._staged[1] if self._staged else None
+
+    def on_partial(self, text: str, confidence: float):
+        """
+        Handle a tentative transcript.
+
+        Args:
+            text: Tentative transcribed text
+            confidence: Draft model confidence (0-1)
+        """
+        if self._staged:
+            return
+
+        group_idx = self.matcher.peek(text)
+        if group_idx is None:
+            return
+        if confidence < self.threshold:
+            # Not staged, but its outcome still tells us how lower thresholds would do
+            self._counts["below_threshold"] += 1
+            if self._shadow is None:
+                self._shadow = (group_idx, confidence)
+            return
+
+        emote = self.matcher.choose(group_idx)
+        self.driver.stage(f"e {emote}")
+        self._staged = (group_idx, emote, confidence, time.monotonic())
+        self._counts["staged"] += 1
+
+    def on_final(self, text: str) -> Optional[str]:
+        """
+        Handle a final transcript, confirming or rolling back any staged emote.
+
+        Args:
+            text: Final transcribed text
+
+        Returns:
+            Emote name if one was played, None otherwise
+        """
+        group_idx = self.matcher.peek(text)
+
+        if self._shadow:
+            shadow_group, confidence = self._shadow
+            self._shadow = None
+            self._history.append((confidence, group_idx == shadow_group))
+
+        if self._staged:
+            staged_group, emote, confidence, _ = self._staged
+            if group_idx == staged_group:
+                self._staged = None
+                self.matcher.consume(group_idx)
+                self.driver.commit()
+                self._counts["hits"] += 1
+                self._history.append((confidence, True))
+                return emote
+            self._roll_back("misses")
+
+        if group_idx is None:
+            return None
+        self.matcher.consume(group_idx)
+        emote = self.matcher.choose(group_idx)
+        self.driver.emote(emote)
+        return emote
+
+    def _roll_back(self, outcome: str):
+        """Roll back the staged emote and record the outcome."""
+        confidence = self._staged[2]
+        self._staged = None
+        self.driver.rollback()
+        self._counts[outcome] += 1
+        self._history.append((confidence, False))
+
+    def cancel(self):
+        """Roll back any staged emote (e.g., when the system is paused)."""
+        if self._staged:
+            self._roll_back("misses")
+
+    def expire(self):
+        """Roll back a staged emote whose final transcript never came."""
+        if self._staged and time.monotonic() - self._staged[3] > self.timeout:
+            self._roll_back("expired")
+
+    def stats(self) -> dict:
+        """
+        Get speculation counters and rates.
+
+        Returns:
+            Dict with staged, hits, misses, expired, below_threshold, hit_rate,
+            rollback_rate, and by_threshold: for each candidate threshold, how
+            many recent candidates (staged or not) would have been staged and
+            their hit rate
+        """
+        result = dict(self._counts)
+        resolved = result["hits"] + result["misses"] + result["expired"]
+        result["hit_rate"] = result["hits"] / resolved if resolved else None
+        result["rollback_rate"] = (result["misses"] + result["expired"]) / resolved \
+            if resolved else None
+
+        by_threshold = {}
+        for threshold in CANDIDATE_THRESHOLDS:
+            outcomes = [hit for confidence, hit in self._history if confidence >= threshold]
+            by_threshold[threshold] = {
+                "staged": len(outcomes),
+                "hit_rate": sum(outcomes) / len(outcomes) if outcomes else None,
+            }
+        result["by_threshold"] = by_threshold
+        return result
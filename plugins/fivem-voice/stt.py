@@ -20,6 +20,7 @@ if sys.platform == "win32":
             if os.path.isdir(dll_path):
                 os.add_dll_directory(dll_path)
 
+import math
 import time
 import threading
 import queue
@@ -30,77 +31,405 @@ SAMPLE_RATE = 16000
 CHUNK_DURATION = 0.5
 CHUNK_SIZE = int(SAMPLE_RATE * CHUNK_DURATION)
 
+# Overload handling when transcription falls behind the microphone:
+#   drop_oldest - only the bounded queue applies; the oldest audio is dropped when full
+#   live_edge   - when the backlog passes the threshold, skip to the newest audio
+#   degrade     - on sustained overload, switch to the next smaller model (then skip);
+#                 the smaller models are loaded up front by start()
+OVERLOAD_POLICIES = ("drop_oldest", "live_edge", "degrade")
+
+# Whisper models from largest to smallest, for the degrade policy
+MODEL_LADDER = ["large-v3", "large-v2", "medium", "small", "base", "tiny"]
+
+# Transcriptions waiting to be read before the oldest are discarded
+MAX_PENDING_RESULTS = 16
+
+
+def is_smaller_model(draft, main):
+    """Check that a draft model is smaller than the main one (True if either is not in MODEL_LADDER)."""
+    if draft not in MODEL_LADDER or main not in MODEL_LADDER:
+        return True
+    return MODEL_LADDER.index(draft) > MODEL_LADDER.index(main)
+
+
+def pcm16_to_float32(data):
+    """Convert raw 16-bit PCM bytes to float32 samples in [-1, 1)."""
+    return np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+
 
 class RealtimeSTT:
     """Real-time speech-to-text with CUDA GPU acceleration."""
 
-    def __init__(self, model_size="tiny", compute_type="float16"):
+    def __init__(self, model_size="tiny", compute_type="float16", max_backlog=3.0,
+                 overload_policy="live_edge", overload_threshold=1.0,
+                 degrade_after=3, max_result_age=2.0, draft_model_size=None):
+        """
+        Initialize the STT engine.
+
+        Args:
+            model_size: Whisper model name
+            compute_type: CTranslate2 compute type
+            max_backlog: Seconds of queued audio kept before the oldest is dropped
+            overload_policy: "drop_oldest", "live_edge" or "degrade"
+            overload_threshold: Backlog seconds that count as overload
+            degrade_after: Consecutive overloaded transcriptions before degrading
+            max_result_age: Seconds after capture a transcription is still delivered
+            draft_model_size: Smaller Whisper model that transcribes each window
+                              alongside the main model, giving tentative results
+                              via get_partial() before the main model finishes
+                              (None to disable)
+
+        Raises:
+            ValueError: If the policy is unknown or the draft model is not
+                        smaller than the main model
+        """
+        if overload_policy not in OVERLOAD_POLICIES:
+            raise ValueError(f"overload_policy must be one of {OVERLOAD_POLICIES}")
+        if draft_model_size and not is_smaller_model(draft_model_size, model_size):
+            raise ValueError(f"draft model '{draft_model_size}' must be smaller than "
+                             f"the main model '{model_size}'")
         self.model_size = model_size
         self.compute_type = compute_type
+        self.max_backlog = max_backlog
+        self.overload_policy = overload_policy
+        self.overload_threshold = overload_threshold
+        self.degrade_after = degrade_after
+        self.max_result_age = max_result_age
+        self.draft_model_size = draft_model_size
         self.model = None
-        self.audio_queue = queue.Queue()
-        self.text_queue = queue.Queue()
+        self.draft_model = None
+        self._fallbacks = []  # (model_size, model) smaller models for degrade, largest first
+        self.audio_queue = queue.Queue()  # Bounded by max_backlog seconds in feed()
+        self.text_queue = queue.Queue(maxsize=MAX_PENDING_RESULTS)
+        self.partial_queue = queue.Queue(maxsize=MAX_PENDING_RESULTS)
+        self._draft_queue = queue.Queue(maxsize=1)  # Newest window waiting for the draft model
         self.running = False
         self._thread = None
+        self._draft_thread = None
+
+        self._stats_lock = threading.Lock()
+        self._queued_samples = 0
+        self._dropped_samples = 0
+        self._dropped_results = 0
+        self._dropped_partials = 0
+        self._last_final_fed_at = 0.0
+        self._skips = 0
+        self._degradations = 0
+        self._overloaded_runs = 0
+        self._last_transcribe = 0.0
+        self._last_window = 0.0
+        self._overlap_samples = 0  # Start of the buffer that was already transcribed
+
+    def _create_model(self, model_size):
+        """Create a Whisper model on GPU (downloads it if not cached)."""
+        from faster_whisper import WhisperModel
+        return WhisperModel(model_size, device="cuda", compute_type=self.compute_type)
 
     def load_model(self):
         """Load Whisper model on GPU."""
-        from faster_whisper import WhisperModel
         print(f"Loading Whisper '{self.model_size}' on CUDA...")
         start = time.time()
-        self.model = WhisperModel(self.model_size, device="cuda", compute_type=self.compute_type)
+        self.model = self._create_model(self.model_size)
         print(f"Model loaded in {time.time() - start:.2f}s")
 
+    def load_draft_model(self):
+        """Load the draft model used for tentative results."""
+        print(f"Loading draft Whisper '{self.draft_model_size}' on CUDA...")
+        self.draft_model = self._create_model(self.draft_model_size)
+
+    def load_fallback_models(self):
+        """
+        Load the smaller models the degrade policy switches to.
+
+        Done before transcription starts so degrading never waits for a
+        download or load. Stops at the first model that fails to load (no
+        network, out of GPU memory); degrading then ends at the last one loaded.
+        """
+        self._fallbacks = []
+        if self.model_size not in MODEL_LADDER:
+            return
+        for model_size in MODEL_LADDER[MODEL_LADDER.index(self.model_size) + 1:]:
+            print(f"Loading fallback Whisper '{model_size}' on CUDA...")
+            try:
+                self._fallbacks.append((model_size, self._create_model(model_size)))
+            except Exception as e:
+                smallest = self._fallbacks[-1][0] if self._fallbacks else self.model_size
+                print(f"[STT] Could not load fallback '{model_size}' ({e}); "
+                      f"degrading stops at '{smallest}'")
+                break
+
+    @property
+    def backlog_seconds(self):
+        """Seconds of audio waiting to be transcribed."""
+        return self._queued_samples / SAMPLE_RATE
+
+    def stats(self):
+        """
+        Get overload gauges.
+
+        Returns:
+            Dict with backlog_seconds, dropped_audio_seconds, dropped_results,
+            dropped_partials, skips, degradations, model_size and realtime_factor
+            (transcription time / audio duration of the last window; above 1.0
+            means falling behind)
+        """
+        with self._stats_lock:
+            return {
+                "backlog_seconds": self._queued_samples / SAMPLE_RATE,
+                "dropped_audio_seconds": self._dropped_samples / SAMPLE_RATE,
+                "dropped_results": self._dropped_results,
+                "dropped_partials": self._dropped_partials,
+                "skips": self._skips,
+                "degradations": self._degradations,
+                "model_size": self.model_size,
+                "realtime_factor": (self._last_transcribe / self._last_window
+                                    if self._last_window else 0.0),
+            }
+
+    def _dequeued(self, samples, dropped=False):
+        """Account for audio leaving the queue."""
+        with self._stats_lock:
+            self._queued_samples -= samples
+            if dropped:
+                self._dropped_samples += samples
+
+    def _skip_to_live_edge(self, buffer):
+        """Discard queued audio, keeping only the newest second."""
+        chunks = [buffer]
+        fed_at = None
+        while True:
+            try:
+                chunk, fed_at = self.audio_queue.get_nowait()
+            except queue.Empty:
+                break
+            self._dequeued(len(chunk))
+            chunks.append(chunk)
+        audio = np.concatenate(chunks)
+        keep = audio[-SAMPLE_RATE:]
+        # The overlap at the start was already transcribed; it isn't lost audio
+        overlap = min(self._overlap_samples, len(buffer))
+        with self._stats_lock:
+            self._dropped_samples += max(0, len(audio) - len(keep) - overlap)
+            self._skips += 1
+        self._overlap_samples = 0
+        return keep, fed_at
+
+    def _degrade(self):
+        """Switch to the next preloaded smaller model. Returns False if none is left."""
+        if not self._fallbacks:
+            return False
+        self.model_size, self.model = self._fallbacks.pop(0)
+        print(f"[STT] Overloaded, degrading to '{self.model_size}'")
+        if self.draft_model is not None and not is_smaller_model(
+                self.draft_model_size, self.model_size):
+            print(f"[STT] Draft '{self.draft_model_size}' is no longer smaller, stopping drafts")
+            self.draft_model = None
+        with self._stats_lock:
+            self._degradations += 1
+        return True
+
+    def _handle_overload(self, buffer):
+        """Apply the overload policy. Returns the (possibly trimmed) buffer and its newest feed time."""
+        if self.overload_policy == "drop_oldest" or self.backlog_seconds <= self.overload_threshold:
+            self._overloaded_runs = 0
+            return buffer, None
+
+        self._overloaded_runs += 1
+        if self.overload_policy == "degrade" and self._overloaded_runs >= self.degrade_after:
+            self._overloaded_runs = 0
+            self._degrade()
+        return self._skip_to_live_edge(buffer)
+
+    def _put_result(self, item, results=None):
+        """Queue a transcription, discarding the oldest if the reader fell behind."""
+        results = self.text_queue if results is None else results
+        partial = results is self.partial_queue
+        while True:
+            try:
+                results.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    results.get_nowait()
+                    self._count_dropped(partial)
+                except queue.Empty:
+                    pass
+
+    def _count_dropped(self, partial):
+        """Count a discarded final or tentative transcription."""
+        with self._stats_lock:
+            if partial:
+                self._dropped_partials += 1
+            else:
+                self._dropped_results += 1
+
+    def _draft(self, buffer, fed_at):
+        """Transcribe with the draft model and queue a tentative result."""
+        segments, _ = self.draft_model.transcribe(
+            buffer,
+            beam_size=1,
+            language="en",
+            vad_filter=True,
+            vad_parameters={"min_silence_duration_ms": 500},
+        )
+        segments = list(segments)
+        text = " ".join(s.text for s in segments).strip().lower()
+        if not text:
+            return
+        if fed_at <= self._last_final_fed_at:
+            self._count_dropped(True)  # The main model already finished this window
+            return
+        # Mean token probability, from the segments' average log-probability
+        confidence = math.exp(sum(s.avg_logprob for s in segments) / len(segments))
+        self._put_result((text, confidence, fed_at), self.partial_queue)
+
+    def _submit_draft(self, buffer, fed_at):
+        """Hand a window to the draft thread, replacing one it has not started."""
+        while True:
+            try:
+                self._draft_queue.put_nowait((buffer, fed_at))
+                return
+            except queue.Full:
+                try:
+                    self._draft_queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _draft_worker(self):
+        """Background thread running the draft model alongside the main one."""
+        while self.running:
+            try:
+                buffer, fed_at = self._draft_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if self.draft_model is not None:
+                self._draft(buffer, fed_at)
+
+    def _process(self, buffer, chunk, fed_at):
+        """Add a chunk to the buffer, transcribing once it holds a full window."""
+        buffer = np.concatenate([buffer, chunk])
+        if len(buffer) < SAMPLE_RATE:  # 1 second minimum
+            return buffer
+
+        buffer, skipped_to = self._handle_overload(buffer)
+        if skipped_to is not None:
+            fed_at = skipped_to
+
+        # Drafts run on their own thread so they never delay the final result,
+        # and are skipped while overloaded so they don't add to the backlog
+        if self.draft_model is not None and self.backlog_seconds <= self.overload_threshold:
+            self._submit_draft(buffer, fed_at)
+
+        start = time.time()
+        segments, _ = self.model.transcribe(
+            buffer,
+            beam_size=1,
+            language="en",
+            vad_filter=True,
+            vad_parameters={"min_silence_duration_ms": 500},
+        )
+        text = " ".join(s.text for s in segments).strip().lower()
+        elapsed = time.time() - start
+        with self._stats_lock:
+            self._last_transcribe = elapsed
+            self._last_window = len(buffer) / SAMPLE_RATE
+        self._last_final_fed_at = fed_at
+        if text:
+            self._put_result((text, elapsed, fed_at))
+        overlap = buffer[-SAMPLE_RATE // 2:]  # Keep 0.5s overlap
+        self._overlap_samples = len(overlap)
+        return overlap
+
     def _worker(self):
         """Background transcription thread."""
         buffer = np.array([], dtype=np.float32)
-        min_length = SAMPLE_RATE  # 1 second minimum
+        self._overlap_samples = 0
 
         while self.running:
             try:
-                chunk = self.audio_queue.get(timeout=0.1)
-                buffer = np.concatenate([buffer, chunk])
-
-                if len(buffer) >= min_length:
-                    start = time.time()
-                    segments, _ = self.model.transcribe(
-                        buffer,
-                        beam_size=1,
-                        language="en",
-                        vad_filter=True,
-                        vad_parameters={"min_silence_duration_ms": 500},
-                    )
-                    text = " ".join(s.text for s in segments).strip().lower()
-                    if text:
-                        self.text_queue.put((text, time.time() - start))
-                    buffer = buffer[-SAMPLE_RATE // 2:]  # Keep 0.5s overlap
+                chunk, fed_at = self.audio_queue.get(timeout=0.1)
             except queue.Empty:
                 continue
+            self._dequeued(len(chunk))
+            buffer = self._process(buffer, chunk, fed_at)
 
     def start(self):
         """Start the STT engine."""
         if not self.model:
             self.load_model()
+        if self.draft_model_size and not self.draft_model:
+            self.load_draft_model()
+        if self.overload_policy == "degrade" and not self._fallbacks:
+            self.load_fallback_models()
         self.running = True
         self._thread = threading.Thread(target=self._worker, daemon=True)
         self._thread.start()
+        if self.draft_model:
+            self._draft_thread = threading.Thread(target=self._draft_worker, daemon=True)
+            self._draft_thread.start()
 
     def stop(self):
         """Stop the STT engine."""
         self.running = False
         if self._thread:
             self._thread.join(timeout=2)
+        if self._draft_thread:
+            self._draft_thread.join(timeout=2)
 
     def feed(self, audio):
-        """Feed audio data (float32 numpy array, 16kHz mono)."""
-        self.audio_queue.put(audio)
+        """
+        Feed audio data (float32 numpy array, 16kHz mono).
+
+        Never blocks: once more than max_backlog seconds are queued, the
+        oldest audio is dropped, whatever size the chunks are.
+        """
+        with self._stats_lock:
+            self._queued_samples += len(audio)
+        self.audio_queue.put_nowait((audio, time.monotonic()))
+        max_samples = self.max_backlog * SAMPLE_RATE
+        while self._queued_samples > max_samples and self.audio_queue.qsize() > 1:
+            try:
+                oldest, _ = self.audio_queue.get_nowait()
+            except queue.Empty:
+                break
+            self._dequeued(len(oldest), dropped=True)
 
     def get(self, timeout=1.0):
-        """Get transcribed text. Returns (text, latency) or None."""
-        try:
-            return self.text_queue.get(timeout=timeout)
-        except queue.Empty:
-            return None
+        """
+        Get transcribed text. Returns (text, latency) or None.
+
+        Transcriptions of audio captured more than max_result_age seconds ago
+        are discarded, so late results never fire triggers.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                text, latency, fed_at = self.text_queue.get(
+                    timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return None
+            if time.monotonic() - fed_at <= self.max_result_age:
+                return text, latency
+            self._count_dropped(False)
+
+    def get_partial(self):
+        """
+        Get a tentative transcription without waiting.
+
+        Only produced when a draft model is configured. The final result for
+        the same audio follows from get().
+
+        Returns:
+            (text, confidence) with confidence in 0-1, or None
+        """
+        while True:
+            try:
+                text, confidence, fed_at = self.partial_queue.get_nowait()
+            except queue.Empty:
+                return None
+            if time.monotonic() - fed_at <= self.max_result_age:
+                return text, confidence
+            self._count_dropped(True)
 
 
 class AudioCapture:
@@ -138,7 +467,7 @@ class AudioCapture:
         self.pa = pyaudio.PyAudio()
 
         def on_audio(in_data, frame_count, time_info, status):
-            audio = np.frombuffer(in_data, dtype=np.int16).astype(np.float32) / 32768.0
+            audio = pcm16_to_float32(in_data)
             for cb in self.callbacks:
                 try:
                     cb(audio)
@@ -9,6 +9,8 @@ import serial
 import serial.tools.list_ports
 import time
 
+from macros import MacroCommands
+
 
 # Known USB-to-serial chip identifiers for ESP32 dev boards
 KNOWN_DEVICES = [
@@ -18,20 +20,67 @@ KNOWN_DEVICES = [
     {"vid": 0x1A86, "pid": 0x55D4, "name": "CH9102"},      # CH9102
 ]
 
+# Firmware TEXT pacing (see RATE command) and line buffer limit
+DEFAULT_TEXT_DELAY_MS = 25
+MIN_TEXT_DELAY_MS = 1
+MAX_TEXT_DELAY_MS = 1000
+MAX_LINE_LENGTH = 256
+
+# Serial reads poll at this interval so long waits can use their own deadline
+READ_POLL_INTERVAL = 0.1
+
+# Commands that hold a key down, and the command that releases it
+RELEASE_COMMANDS = {"PRESS": "RELEASE", "RAWPRESS": "RAWRELEASE"}
+
+
+def track_held(held, cmd):
+    """
+    Keep a set of held keys in sync with a command that ran.
+
+    Args:
+        held: Set of (command, key) pairs, e.g. ("PRESS", "CTRL") or ("RAWPRESS", "0X17")
+        cmd: Command string that was sent
+    """
+    name, _, arg = cmd.partition(":")
+    name = name.strip().upper()
+    arg = arg.strip().upper()
+    if name in RELEASE_COMMANDS:
+        held.add((name, arg))
+    elif name == "RELEASE":
+        held.discard(("PRESS", arg))
+    elif name == "RAWRELEASE":
+        held.discard(("RAWPRESS", arg))
+    elif name == "RELEASEALL":
+        held.clear()
 
-class Bighead:
+
+def release_commands(held):
+    """Commands that release every key in a set maintained by track_held()."""
+    return [f"{RELEASE_COMMANDS[name]}:{key}" for name, key in sorted(held)]
+
+
+class Bighead(MacroCommands):
     """Connection handler for the ESP32 BLE keyboard."""
 
-    def __init__(self, port=None, baud=115200):
+    def __init__(self, port=None, baud=115200, timeout=2.0, serial_number=None, settle=2.0):
         """
         Initialize Bighead connection parameters.
 
         Args:
             port: Serial port (auto-detected if None)
             baud: Baud rate (default 115200)
+            timeout: Seconds to wait for a command response (default 2)
+            serial_number: USB serial number to look for when auto-detecting
+            settle: Seconds to wait after opening the port. If 0, probe with
+                    STATUS until the device answers instead (up to `timeout`)
         """
         self.port = port
         self.baud = baud
+        self.timeout = timeout
+        self.serial_number = serial_number
+        self.settle = settle
+        self.text_delay_ms = DEFAULT_TEXT_DELAY_MS
+        self.macro_bodies = {}  # Macro id -> body, for RUN timeouts
         self.ser = None
         self._connected = False
 
@@ -61,14 +110,19 @@ class Bighead:
         return ports
 
     @staticmethod
-    def find_port():
+    def find_port(serial_number=None):
         """
         Auto-detect the Bighead device port.
 
+        Args:
+            serial_number: Only match the device with this USB serial number
+
         Returns:
             Port string (e.g., "COM9") or None if not found
         """
         for p in serial.tools.list_ports.comports():
+            if serial_number is not None and p.serial_number != serial_number:
+                continue
             for device in KNOWN_DEVICES:
                 if p.vid == device["vid"] and p.pid == device["pid"]:
                     return p.device
@@ -86,7 +140,7 @@ class Bighead:
         """
         # Auto-detect port if not specified
         if self.port is None:
-            self.port = self.find_port()
+            self.port = self.find_port(self.serial_number)
             if self.port is None:
                 available = self.list_ports()
                 if available:
@@ -100,13 +154,44 @@ class Bighead:
                     )
                 raise ConnectionError("No serial ports found")
 
-        self.ser = serial.Serial(self.port, self.baud, timeout=2)
-        time.sleep(2)  # Wait for BLE to stabilize
+        if self.serial_number is None:
+            for p in serial.tools.list_ports.comports():
+                if p.device == self.port:
+                    self.serial_number = p.serial_number
+
+        self.ser = serial.Serial(self.port, self.baud, timeout=READ_POLL_INTERVAL)
+        if self.settle:
+            time.sleep(self.settle)  # Wait for BLE to stabilize
+        elif not self.wait_ready(self.timeout):
+            self.ser.close()
+            self.ser = None
+            raise ConnectionError(f"Bighead device on {self.port} did not respond")
         self.ser.reset_input_buffer()
         self.send("RELEASEALL")  # Clear any stuck keys
+        self.send(f"RATE:{self.text_delay_ms}")  # Sync typing rate
         self._connected = True
         return self
 
+    def wait_ready(self, timeout):
+        """
+        Probe with STATUS until the firmware answers.
+
+        Returns as soon as the device responds, so a reconnect to a device
+        that did not reset costs one round trip instead of a fixed sleep.
+
+        Args:
+            timeout: Seconds to keep probing
+
+        Returns:
+            True if the device answered, False on timeout
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            response = self.send("STATUS", timeout=READ_POLL_INTERVAL)
+            if response in ("OK:CONNECTED", "OK:DISCONNECTED"):
+                return True
+        return False
+
     def disconnect(self):
         """Disconnect and release all keys."""
         if self.ser:
@@ -115,20 +200,54 @@ class Bighead:
             self.ser = None
         self._connected = False
 
-    def send(self, cmd):
+    def write(self, cmd):
         """
-        Send a raw command to the ESP32.
+        Write a raw command without waiting for its response.
+
+        Used for pipelining; every write must be paired with a later
+        read_response() since the device answers each command in order.
 
         Args:
             cmd: Command string (e.g., "KEY:ENTER", "TEXT:hello")
+        """
+        if not self.ser:
+            raise ConnectionError("Not connected to Bighead device")
+        self.ser.write(f"{cmd}\n".encode())
+
+    def read_response(self, timeout=None):
+        """
+        Read one response line from the ESP32.
+
+        Args:
+            timeout: Seconds to wait (default: self.timeout)
 
         Returns:
-            Response string from device
+            Response string, or "" if nothing arrived in time
         """
         if not self.ser:
             raise ConnectionError("Not connected to Bighead device")
-        self.ser.write(f"{cmd}\n".encode())
-        return self.ser.readline().decode().strip()
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        line = b""
+        while True:
+            line += self.ser.readline()
+            if line.endswith(b"\n") or time.monotonic() >= deadline:
+                return line.decode(errors="replace").strip()
+
+    def send(self, cmd, timeout=None):
+        """
+        Send a raw command to the ESP32.
+
+        Args:
+            cmd: Command string (e.g., "KEY:ENTER", "TEXT:hello")
+            timeout: Seconds to wait for the response (default: self.timeout)
+
+        Returns:
+            Response string from device
+        """
+        self.write(cmd)
+        return self.read_response(timeout)
 
     def key(self, key_name):
         """Press and release a key."""
@@ -147,12 +266,26 @@ class Bighead:
         return self.send("RELEASEALL")
 
     def text(self, content):
-        """Type text string."""
-        return self.send(f"TEXT:{content}")
+        """
+        Type text string.
+
+        Waits long enough for the device to type every character. For text
+        longer than one serial line, or to get progress and cancellation,
+        use text_stream.TextStreamer instead.
+        """
+        typing_time = len(content) * self.text_delay_ms / 1000
+        return self.send(f"TEXT:{content}", timeout=self.timeout + typing_time)
+
+    def rate(self, ms):
+        """Set the per-character TEXT delay on the device (1-1000 ms)."""
+        response = self.send(f"RATE:{int(ms)}")
+        if response == "OK:RATE_SET":
+            self.text_delay_ms = int(ms)
+        return response
 
     def delay(self, ms):
         """Wait for specified milliseconds on device."""
-        return self.send(f"DELAY:{ms}")
+        return self.send(f"DELAY:{ms}", timeout=self.timeout + ms / 1000)
 
     def status(self):
         """Check BLE connection status."""
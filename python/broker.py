@@ -0,0 +1,415 @@
+"""
+Bighead Broker
+
+Daemon that owns the serial connection to the ESP32 and shares it between
+local applications over a Unix domain socket (or local TCP). Requests from
+different clients are scheduled round-robin, one request at a time, so a
+busy client cannot starve the others and multi-command requests (chords,
+emote sequences) never interleave. Use broker_client.BigheadClient to talk
+to it.
+
+Usage:
+    python broker.py                     # Unix socket, auto-detected device
+    python broker.py --tcp 127.0.0.1:7878 --port COM9
+"""
+
+import argparse
+import errno
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+
+from bighead import Bighead, release_commands, track_held
+from broker_client import DEFAULT_HOST, DEFAULT_SOCKET, DEFAULT_TCP_PORT
+from supervisor import SupervisedBighead
+
+
+# Latency samples kept per client for percentile stats
+LATENCY_HISTORY = 1000
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    """Threaded TCP server that can rebind a port left in TIME_WAIT."""
+
+    allow_reuse_address = True
+
+
+def check_loopback(host):
+    """
+    Make sure a TCP host only accepts connections from this machine.
+
+    The broker has no authentication, so listening on a network interface
+    would let anyone who can reach it type on this computer.
+
+    Raises:
+        ValueError: If the host is unknown or resolves to a non-loopback address
+    """
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)}
+    except OSError as e:
+        raise ValueError(f"Cannot resolve host {host!r}: {e}") from e
+    for address in addresses:
+        if not ipaddress.ip_address(address.split("%")[0]).is_loopback:
+            raise ValueError(f"Refusing to listen on {host!r} ({address}): "
+                             "only loopback addresses are allowed")
+
+
+def is_valid_command(cmd):
+    """
+    Check that a client command is exactly one non-blank line.
+
+    The firmware ends a line at either CR or LF, so an embedded one would run
+    as two commands with two responses and shift every later response by
+    one; a blank line gets no response and stalls the scheduler until timeout.
+    """
+    return isinstance(cmd, str) and bool(cmd.strip()) and "\r" not in cmd and "\n" not in cmd
+
+
+class _Job:
+    """An atomic list of commands from one client."""
+
+    def __init__(self, cmds):
+        self.cmds = cmds
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        self.responses = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class _Client:
+    """Per-connection queue, held keys, and latency stats."""
+
+    def __init__(self, client_id):
+        self.id = client_id
+        self.name = f"client{client_id}"
+        self.jobs = deque()
+        self.held = set()
+        self.requests = 0
+        self.commands = 0
+        self.latency_ms = deque(maxlen=LATENCY_HISTORY)
+        self.wait_ms = deque(maxlen=LATENCY_HISTORY)
+
+    def stats(self):
+        """Summarize latency (queue wait + device time) in milliseconds."""
+        latency = sorted(self.latency_ms)
+        result = {
+            "name": self.name,
+            "requests": self.requests,
+            "commands": self.commands,
+            "queued": len(self.jobs),
+        }
+        if latency:
+            result.update({
+                "mean_ms": sum(latency) / len(latency),
+                "p50_ms": latency[len(latency) // 2],
+                "p95_ms": latency[min(len(latency) - 1, int(len(latency) * 0.95))],
+                "max_ms": latency[-1],
+                "mean_wait_ms": sum(self.wait_ms) / len(self.wait_ms),
+            })
+        return result
+
+
+class Broker:
+    """Shares one Bighead connection between many local clients."""
+
+    def __init__(self, bighead, path=None, host=None, port=None):
+        """
+        Initialize the broker.
+
+        Args:
+            bighead: Connected Bighead (or SupervisedBighead) to share
+            path: Unix socket path (default when neither path nor host is given)
+            host: TCP host to listen on instead of a Unix socket (loopback only)
+            port: TCP port (default 7878)
+
+        Raises:
+            ValueError: If host is not a loopback address
+        """
+        if path is None and host is None:
+            if hasattr(socketserver, "ThreadingUnixStreamServer"):
+                path = DEFAULT_SOCKET
+            else:
+                host = DEFAULT_HOST
+        if host is not None:
+            check_loopback(host)
+        self.bighead = bighead
+        self.path = path
+        self.host = host
+        self.port = port or DEFAULT_TCP_PORT
+
+        self._clients = []
+        self._next_client_id = 0
+        self._rr_index = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._server = None
+        self._scheduler_thread = None
+        self._server_thread = None
+
+    @property
+    def address(self):
+        """Where clients connect (socket path or "host:port")."""
+        return self.path if self.host is None else f"{self.host}:{self.port}"
+
+    def _register(self):
+        """Add a client to the round-robin schedule."""
+        with self._cond:
+            self._next_client_id += 1
+            client = _Client(self._next_client_id)
+            self._clients.append(client)
+            return client
+
+    def _unregister(self, client):
+        """Remove a client, releasing keys it left held."""
+        if client.held:
+            job = self.submit(client, release_commands(client.held))
+            job.done.wait(timeout=5)
+        with self._cond:
+            index = self._clients.index(client)
+            self._clients.remove(client)
+            if index < self._rr_index:
+                self._rr_index -= 1
+
+    def submit(self, client, cmds):
+        """Queue an atomic job for a client and return it."""
+        job = _Job(cmds)
+        with self._cond:
+            client.jobs.append(job)
+            self._cond.notify()
+        return job
+
+    def _next_job(self):
+        """Pick the next job round-robin across clients with queued work."""
+        with self._cond:
+            while self._running:
+                count = len(self._clients)
+                for offset in range(count):
+                    index = (self._rr_index + offset) % count
+                    client = self._clients[index]
+                    if client.jobs:
+                        self._rr_index = (index + 1) % count
+                        return client, client.jobs.popleft()
+                self._cond.wait(timeout=0.5)
+        return None, None
+
+    def _run(self, cmd):
+        """
+        Run one command, waiting as long as it takes on the device.
+
+        TEXT, DELAY, RATE and the macro commands go through the matching
+        Bighead methods, so long commands get their full typing, delay or
+        macro time and the connection's rate and macro durations stay in sync.
+        """
+        bh = self.bighead
+        name, _, arg = cmd.partition(":")
+        name = name.strip().upper()
+        try:
+            if name == "TEXT":
+                return bh.text(arg)
+            if name == "DELAY":
+                return bh.delay(int(arg))
+            if name == "RATE":
+                return bh.rate(int(arg))
+            if name == "RUN":
+                return bh.run_macro(arg.strip())
+            if name == "MACRO":
+                macro_id, _, body = arg.partition(":")
+                return bh.upload_macro(macro_id.strip(), body)
+            if name == "MACRODEL":
+                return bh.delete_macro(arg.strip())
+        except ValueError:
+            pass  # Malformed; let the device report the error
+        return bh.send(cmd)
+
+    def _scheduler(self):
+        """Background thread that runs jobs on the device."""
+        while self._running:
+            client, job = self._next_job()
+            if job is None:
+                continue
+            job.started_at = time.monotonic()
+            responses = []
+            try:
+                for cmd in job.cmds:
+                    responses.append(self._run(cmd))
+                    track_held(client.held, cmd)
+            except (ConnectionError, OSError) as e:
+                job.error = str(e)
+            job.responses = responses
+            finished = time.monotonic()
+
+            with self._cond:
+                client.requests += 1
+                client.commands += len(responses)
+                client.latency_ms.append((finished - job.queued_at) * 1000)
+                client.wait_ms.append((job.started_at - job.queued_at) * 1000)
+            job.done.set()
+
+    def stats(self):
+        """Per-client stats, keyed by client name."""
+        with self._cond:
+            return {c.name: c.stats() for c in self._clients}
+
+    def _make_handler(self):
+        """Build the request handler class bound to this broker."""
+        broker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                client = broker._register()
+                try:
+                    for line in self.rfile:
+                        reply = broker._handle_message(client, line)
+                        self.wfile.write(json.dumps(reply).encode() + b"\n")
+                        self.wfile.flush()
+                except (ConnectionError, OSError):
+                    pass
+                finally:
+                    broker._unregister(client)
+
+        return Handler
+
+    def _handle_message(self, client, line):
+        """Handle one JSON request line and return the reply dict."""
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return {"error": "Invalid JSON request"}
+        if not isinstance(message, dict):
+            return {"error": "Request must be a JSON object"}
+        reply = {"id": message.get("id")}
+        op = message.get("op")
+
+        if op == "hello":
+            client.name = f"{message.get('name', 'client')}#{client.id}"
+        elif op == "stats":
+            reply["stats"] = self.stats()
+        elif "cmds" in message:
+            cmds = message["cmds"]
+            if not isinstance(cmds, list) or not all(is_valid_command(c) for c in cmds):
+                reply["error"] = "cmds must be a list of non-empty single-line strings"
+                return reply
+            job = self.submit(client, cmds)
+            job.done.wait()
+            if job.error:
+                reply["error"] = job.error
+            else:
+                reply["responses"] = job.responses
+        else:
+            reply["error"] = f"Unknown request: {op}"
+        return reply
+
+    def _remove_stale_socket(self):
+        """
+        Remove a socket file left by a broker that is no longer running.
+
+        Raises:
+            OSError: If another broker is still serving on the socket
+        """
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            os.unlink(self.path)  # Nothing answers: stale socket from a previous run
+            return
+        finally:
+            probe.close()
+        raise OSError(errno.EADDRINUSE, f"A broker is already serving {self.path}")
+
+    def start(self):
+        """
+        Start listening and scheduling in background threads.
+
+        Raises:
+            OSError: If the socket or TCP port is already in use
+        """
+        handler = self._make_handler()
+        if self.host is None:
+            if os.path.exists(self.path):
+                self._remove_stale_socket()
+            self._server = socketserver.ThreadingUnixStreamServer(self.path, handler)
+        else:
+            self._server = _TCPServer((self.host, self.port), handler)
+            self._server.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._server.daemon_threads = True
+
+        self._running = True
+        self._scheduler_thread = threading.Thread(target=self._scheduler, daemon=True)
+        self._scheduler_thread.start()
+        self._server_thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._server_thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving clients."""
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            if self.host is None and os.path.exists(self.path):
+                os.unlink(self.path)
+        if self._scheduler_thread:
+            self._scheduler_thread.join(timeout=2)
+
+    def __enter__(self):
+        """Context manager support."""
+        return self.start()
+
+    def __exit__(self, *args):
+        """Context manager cleanup."""
+        self.stop()
+
+
+def main():
+    """Entry point."""
+    parser = argparse.ArgumentParser(description="Share a Bighead device between applications")
+    parser.add_argument("--socket", help=f"Unix socket path (default {DEFAULT_SOCKET})")
+    parser.add_argument("--tcp", metavar="HOST:PORT",
+                        help=f"Listen on local TCP instead (e.g. {DEFAULT_HOST}:{DEFAULT_TCP_PORT})")
+    parser.add_argument("--port", help="Serial port (auto-detected if omitted)")
+    parser.add_argument("--no-reconnect", action="store_true",
+                        help="Use a plain connection instead of an auto-reconnecting one")
+    args = parser.parse_args()
+
+    host = port = None
+    if args.tcp:
+        host, _, port = args.tcp.rpartition(":")
+        host, port = host or DEFAULT_HOST, int(port)
+
+    device = Bighead(args.port) if args.no_reconnect else SupervisedBighead(args.port)
+    try:
+        device.connect()
+    except ConnectionError as e:
+        print(f"Error: {e}")
+        return 1
+
+    try:
+        broker = Broker(device, path=args.socket, host=host, port=port)
+        broker.start()
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        device.disconnect()
+        return 1
+    print(f"Bighead on {device.port}, serving at {broker.address}. Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    broker.stop()
+    device.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+Bighead Broker Client
+
+Thin client for the Bighead broker (see broker.py). Mirrors the Bighead API,
+so scripts can share one device by swapping `Bighead()` for `BigheadClient()`.
+
+Protocol: one JSON object per line in each direction.
+    {"id": 1, "cmds": ["PRESS:CTRL", "KEY:V", "RELEASE:CTRL"]}
+    {"id": 1, "responses": ["OK:KEY_PRESSED", "OK:KEY_SENT", "OK:KEY_RELEASED"]}
+All commands in one request run back to back, never interleaved with other
+clients. {"id": 2, "op": "stats"} returns per-client latency stats.
+"""
+
+import json
+import os
+import socket
+import tempfile
+
+from macros import MacroCommands
+
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "bighead.sock")
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_TCP_PORT = 7878
+
+
+class _Commands:
+    """Bighead command methods built on self.send()."""
+
+    def key(self, key_name):
+        """Press and release a key."""
+        return self.send(f"KEY:{key_name}")
+
+    def press(self, key_name):
+        """Press and hold a key."""
+        return self.send(f"PRESS:{key_name}")
+
+    def release(self, key_name):
+        """Release a held key."""
+        return self.send(f"RELEASE:{key_name}")
+
+    def release_all(self):
+        """Release all held keys."""
+        return self.send("RELEASEALL")
+
+    def text(self, content):
+        """Type text string."""
+        return self.send(f"TEXT:{content}")
+
+    def rate(self, ms):
+        """Set the per-character TEXT delay on the device (1-1000 ms)."""
+        return self.send(f"RATE:{int(ms)}")
+
+    def delay(self, ms):
+        """Wait for specified milliseconds on device."""
+        return self.send(f"DELAY:{ms}")
+
+    def status(self):
+        """Check BLE connection status."""
+        return self.send("STATUS")
+
+
+class Sequence(_Commands):
+    """
+    Commands collected for atomic execution.
+
+    Command methods return None; responses are available in `responses`
+    once the with-block exits.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self.commands = []
+        self.responses = None
+
+    def send(self, cmd):
+        """Add a raw command to the sequence."""
+        self.commands.append(cmd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None and self.commands:
+            self.responses = self._client.send_many(self.commands)
+
+
+class BigheadClient(_Commands, MacroCommands):
+    """Client connection to a Bighead broker."""
+
+    def __init__(self, path=None, host=None, port=None, name=None, timeout=None):
+        """
+        Initialize client connection parameters.
+
+        Args:
+            path: Unix socket path (default when neither path nor host is given)
+            host: TCP host to use instead of a Unix socket
+            port: TCP port (default 7878)
+            name: Client name shown in broker stats (default: process id)
+            timeout: Socket timeout in seconds (None waits indefinitely)
+        """
+        if path is None and host is None:
+            if hasattr(socket, "AF_UNIX"):
+                path = DEFAULT_SOCKET
+            else:
+                host = DEFAULT_HOST
+        self.path = path
+        self.host = host
+        self.port = port or DEFAULT_TCP_PORT
+        self.name = name or f"pid{os.getpid()}"
+        self.timeout = timeout
+        self.text_delay_ms = None  # Tracked by the broker
+        self.macro_bodies = {}
+        self._sock = None
+        self._file = None
+        self._next_id = 0
+
+    @property
+    def connected(self):
+        """Check if connected to the broker."""
+        return self._sock is not None
+
+    def connect(self):
+        """
+        Connect to the broker.
+
+        Returns:
+            self for method chaining
+
+        Raises:
+            ConnectionError: If the broker is not running
+        """
+        try:
+            if self.host is None:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(self.timeout)
+                sock.connect(self.path)
+            else:
+                sock = socket.create_connection((self.host, self.port), self.timeout)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError as e:
+            where = self.path if self.host is None else f"{self.host}:{self.port}"
+            raise ConnectionError(f"Bighead broker not reachable at {where}: {e}")
+        self._sock = sock
+        self._file = sock.makefile("rwb")
+        self._request({"op": "hello", "name": self.name})
+        return self
+
+    def disconnect(self):
+        """Disconnect from the broker (it releases any keys this client holds)."""
+        if self._sock:
+            self._file.close()
+            self._sock.close()
+            self._sock = None
+            self._file = None
+
+    def _request(self, message):
+        """Send one request and wait for its reply."""
+        if not self._sock:
+            raise ConnectionError("Not connected to Bighead broker")
+        self._next_id += 1
+        message["id"] = self._next_id
+        self._file.write(json.dumps(message).encode() + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            self.disconnect()
+            raise ConnectionError("Bighead broker closed the connection")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise ConnectionError(reply["error"])
+        return reply
+
+    def send(self, cmd, timeout=None):
+        """
+        Send a raw command through the broker.
+
+        Args:
+            cmd: Command string (e.g., "KEY:ENTER", "TEXT:hello")
+            timeout: Unused; the broker waits as long as each command needs
+
+        Returns:
+            Response string from device
+        """
+        return self.send_many([cmd])[0]
+
+    def send_many(self, cmds):
+        """
+        Run commands back to back without other clients interleaving.
+
+        Args:
+            cmds: List of command strings
+
+        Returns:
+            List of response strings, one per command
+        """
+        return self._request({"cmds": list(cmds)})["responses"]
+
+    def sequence(self):
+        """
+        Collect commands in a with-block and run them atomically on exit.
+
+            with client.sequence() as seq:
+                seq.press("CTRL")
+                seq.key("V")
+                seq.release("CTRL")
+        """
+        return Sequence(self)
+
+    def stats(self):
+        """Get per-client latency stats from the broker."""
+        return self._request({"op": "stats"})["stats"]
+
+    def __enter__(self):
+        """Context manager support."""
+        return self.connect()
+
+    def __exit__(self, *args):
+        """Context manager cleanup."""
+        self.disconnect()
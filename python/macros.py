@@ -0,0 +1,358 @@
+"""
+Bighead Macros
+
+Encoding, hashing, and a host-side reference model for macros stored on the
+ESP32. A macro is a list of steps saved in the device's non-volatile storage
+with MACRO:<id>:<body> and played with a single RUN:<id> command, so its
+timing is kept by the device instead of the host scheduler.
+
+Body format: steps separated by "|", each an op letter and an argument.
+    P<key>   press and hold a key          PCTRL
+    R<key>   release a key                 RCTRL
+    K<key>   press and release a key       KENTER
+    W<ms>    wait 1-10000 milliseconds     W150
+    T<text>  type text (TEXT pacing)       T/e dance
+    A        release all keys              A
+All keys are released when a macro finishes.
+
+MacroModel mirrors the firmware's macro commands and produces a timed event
+list for RUN, so upload/execute semantics can be checked without hardware.
+"""
+
+
+# Must match the firmware (src/main.cpp)
+MAX_MACRO_ID_LENGTH = 12
+MAX_MACROS = 64
+MAX_LINE_LENGTH = 256
+MAX_WAIT_MS = 10000
+DEFAULT_TEXT_DELAY_MS = 25
+MAX_TEXT_DELAY_MS = 1000  # Slowest RATE
+
+# Longest body that fits in a MACRO line with a one-character id
+MAX_BODY_LENGTH = MAX_LINE_LENGTH - 1 - len("MACRO:X:")
+
+# Upper bound on any stored macro's playback time, for RUN of a macro whose
+# body is unknown: either all waits ("W9999|" packs the most waiting into each
+# byte; the last step adds at most one more) or all text at the slowest RATE
+MAX_RUN_MS = max((MAX_BODY_LENGTH + 1) // len("W9999|") * 9999 + MAX_WAIT_MS,
+                 MAX_BODY_LENGTH * MAX_TEXT_DELAY_MS)
+
+OPS = {
+    "press": "P",
+    "release": "R",
+    "key": "K",
+    "wait": "W",
+    "text": "T",
+    "release_all": "A",
+}
+OP_NAMES = {code: name for name, code in OPS.items()}
+
+# Key names understood by the firmware's getKeyCode()
+KEY_NAMES = {
+    "ENTER", "RETURN", "TAB", "SPACE", "BACKSPACE", "BKSP", "DELETE", "DEL",
+    "ESC", "ESCAPE", "UP", "DOWN", "LEFT", "RIGHT",
+    "CTRL", "CONTROL", "SHIFT", "ALT", "GUI", "WIN", "WINDOWS", "META",
+    "RCTRL", "RSHIFT", "RALT", "RGUI",
+    "F1", "F2", "F3", "F4", "F5", "F6", "F7", "F8", "F9", "F10", "F11", "F12",
+    "HOME", "END", "PAGEUP", "PGUP", "PAGEDOWN", "PGDN", "INSERT", "INS",
+    "CAPSLOCK", "CAPS", "PRINTSCREEN", "PRTSC",
+}
+KEY_NAMES.update("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789")
+
+
+def is_valid_id(macro_id):
+    """Check a macro id: 1-12 characters of A-Z, 0-9 and _ (case-insensitive)."""
+    macro_id = macro_id.upper()
+    return 0 < len(macro_id) <= MAX_MACRO_ID_LENGTH and all(
+        c.isascii() and (c.isalnum() or c == "_") for c in macro_id)
+
+
+def _parse_step(step):
+    """
+    Parse one encoded step.
+
+    Returns:
+        (op_name, arg) or None if the step is invalid
+    """
+    if not step:
+        return None
+    code, arg = step[0].upper(), step[1:]
+    if code == "T":
+        return "text", arg
+    arg = arg.strip().upper()
+    if code == "A":
+        return ("release_all", None) if not arg else None
+    if code == "W":
+        if not (arg.isascii() and arg.isdigit()):
+            return None
+        ms = int(arg)
+        return ("wait", ms) if 0 < ms <= MAX_WAIT_MS else None
+    if code in ("P", "R", "K") and arg in KEY_NAMES:
+        return OP_NAMES[code], arg
+    return None
+
+
+def decode(body):
+    """
+    Parse a macro body into steps.
+
+    Returns:
+        List of (op, arg) tuples
+
+    Raises:
+        ValueError: If any step is invalid
+    """
+    if not body:
+        raise ValueError("Macro body is empty")
+    steps = []
+    for step in body.split("|"):
+        parsed = _parse_step(step)
+        if parsed is None:
+            raise ValueError(f"Invalid macro step: {step!r}")
+        steps.append(parsed)
+    return steps
+
+
+def encode(steps):
+    """
+    Encode steps into a macro body.
+
+    Args:
+        steps: List of (op, arg) tuples, e.g. [("press", "CTRL"), ("key", "V"),
+               ("release", "CTRL"), ("wait", 50), ("text", "hi"), ("release_all", None)]
+
+    Returns:
+        Body string for upload
+
+    Raises:
+        ValueError: If a step is invalid
+    """
+    parts = []
+    for op, arg in steps:
+        if op not in OPS:
+            raise ValueError(f"Unknown macro op: {op}")
+        if op == "text" and ("|" in arg or "\n" in arg or "\r" in arg):
+            raise ValueError("Macro text cannot contain '|' or newlines")
+        parts.append(OPS[op] + ("" if arg is None else str(arg)))
+    body = "|".join(parts)
+    decode(body)  # Validate with the same rules as the firmware
+    return body
+
+
+def macro_hash(body):
+    """FNV-1a 32-bit hash of a macro body as 8 hex digits (matches MACROHASH)."""
+    h = 0x811C9DC5
+    for byte in body.encode():
+        h ^= byte
+        h = (h * 0x01000193) & 0xFFFFFFFF
+    return f"{h:08x}"
+
+
+def duration_ms(body, text_delay_ms=DEFAULT_TEXT_DELAY_MS):
+    """Minimum time the device takes to run a macro body."""
+    total = 0
+    for op, arg in decode(body):
+        if op == "wait":
+            total += arg
+        elif op == "text":
+            total += len(arg) * text_delay_ms
+    return total
+
+
+def upload_command(macro_id, body):
+    """
+    Build the MACRO command for an upload.
+
+    Raises:
+        ValueError: If the id is invalid or the command exceeds the line buffer
+    """
+    if not is_valid_id(macro_id):
+        raise ValueError(f"Invalid macro id: {macro_id!r}")
+    cmd = f"MACRO:{macro_id.upper()}:{body}"
+    if len(cmd.encode()) >= MAX_LINE_LENGTH:
+        raise ValueError(f"Macro too long ({len(cmd)} of {MAX_LINE_LENGTH - 1} bytes)")
+    return cmd
+
+
+def parse_list(response):
+    """Macro ids from a MACROS response."""
+    if not response.startswith("OK:MACROS:"):
+        return []
+    return [macro_id for macro_id in response[len("OK:MACROS:"):].split(",") if macro_id]
+
+
+def parse_hash(response):
+    """Hash from a MACROHASH response, or None."""
+    if response.startswith("OK:HASH:"):
+        return response[len("OK:HASH:"):]
+    return None
+
+
+class MacroCommands:
+    """
+    Macro methods built on self.send(cmd, timeout).
+
+    Shared by Bighead, SupervisedBighead and BigheadClient. Classes using it
+    provide `timeout`, `text_delay_ms` and a `macro_bodies` dict, which holds
+    the bodies of macros uploaded or verified in this session.
+    """
+
+    def _remember(self, macro_id, body):
+        """Keep a macro's body so run_macro() knows how long it plays."""
+        self.macro_bodies[macro_id.upper()] = body
+
+    def upload_macro(self, macro_id, steps):
+        """
+        Store a macro on the device (persists across resets).
+
+        Args:
+            macro_id: 1-12 characters of A-Z, 0-9 and _
+            steps: Encoded body string or list of (op, arg) steps
+
+        Returns:
+            Response string from device ("OK:MACRO_SAVED" on success)
+
+        Raises:
+            ValueError: If the id or steps are invalid, or the macro is too long
+        """
+        body = steps if isinstance(steps, str) else encode(steps)
+        response = self.send(upload_command(macro_id, body))
+        if response == "OK:MACRO_SAVED":
+            self._remember(macro_id, body)
+        return response
+
+    def list_macros(self):
+        """List the ids of macros stored on the device."""
+        return parse_list(self.send("MACROS"))
+
+    def macro_hash(self, macro_id):
+        """Get the FNV-1a hash of a stored macro body, or None if it doesn't exist."""
+        return parse_hash(self.send(f"MACROHASH:{macro_id}"))
+
+    def verify_macro(self, macro_id, steps):
+        """
+        Check that the device holds exactly this macro.
+
+        Args:
+            macro_id: Macro id
+            steps: Encoded body string or list of (op, arg) steps
+
+        Returns:
+            True if the stored body's hash matches
+        """
+        body = steps if isinstance(steps, str) else encode(steps)
+        if self.macro_hash(macro_id) != macro_hash(body):
+            return False
+        self._remember(macro_id, body)
+        return True
+
+    def delete_macro(self, macro_id):
+        """Remove a stored macro."""
+        self.macro_bodies.pop(macro_id.upper(), None)
+        return self.send(f"MACRODEL:{macro_id}")
+
+    def run_macro(self, macro_id):
+        """
+        Play a stored macro with a single command.
+
+        Waits for the macro to finish, so its OK:RAN is never read as the
+        response to a later command. The wait is the macro's duration at the
+        current rate when upload_macro() or verify_macro() saw its body in
+        this session, and otherwise MAX_RUN_MS, the longest any stored macro
+        can play. The response returns as soon as it arrives either way.
+        """
+        body = self.macro_bodies.get(macro_id.upper())
+        if body is None:
+            duration = MAX_RUN_MS
+        else:
+            duration = duration_ms(body, self.text_delay_ms or DEFAULT_TEXT_DELAY_MS)
+        return self.send(f"RUN:{macro_id}", timeout=(self.timeout or 0) + duration / 1000)
+
+
+class MacroModel:
+    """
+    Reference model of the firmware's macro store and executor.
+
+    handle() answers MACRO, MACROS, MACROHASH, MACRODEL and RUN lines with the
+    same responses as the device; RUN records a timed event list in `events`.
+    """
+
+    def __init__(self, text_delay_ms=DEFAULT_TEXT_DELAY_MS, ble_connected=True):
+        """
+        Initialize an empty macro store.
+
+        Args:
+            text_delay_ms: Per-character delay for text steps
+            ble_connected: Whether RUN should behave as if BLE is connected
+        """
+        self.text_delay_ms = text_delay_ms
+        self.ble_connected = ble_connected
+        self.store = {}
+        self.events = []
+
+    def handle(self, line):
+        """
+        Process one command line as the firmware would.
+
+        Returns:
+            Response string
+        """
+        command = line.strip().upper()
+        if command.startswith("MACRO:"):
+            macro_id, sep, _ = command[len("MACRO:"):].partition(":")
+            body = line[line.index(":") + 1:].partition(":")[2]
+            if not sep or not is_valid_id(macro_id):
+                return "ERROR:INVALID_MACRO_ID"
+            try:
+                decode(body)
+            except ValueError:
+                return "ERROR:INVALID_MACRO"
+            if macro_id not in self.store and len(self.store) >= MAX_MACROS:
+                return "ERROR:MACRO_STORAGE_FULL"
+            self.store[macro_id] = body
+            return "OK:MACRO_SAVED"
+        if command == "MACROS":
+            return "OK:MACROS:" + ",".join(self.store)
+        if command.startswith("MACROHASH:"):
+            body = self.store.get(command[len("MACROHASH:"):].strip())
+            return f"OK:HASH:{macro_hash(body)}" if body is not None else "ERROR:UNKNOWN_MACRO"
+        if command.startswith("MACRODEL:"):
+            if self.store.pop(command[len("MACRODEL:"):].strip(), None) is None:
+                return "ERROR:UNKNOWN_MACRO"
+            return "OK:MACRO_DELETED"
+        if command.startswith("RUN:"):
+            if not self.ble_connected:
+                return "ERROR:NOT_CONNECTED"
+            body = self.store.get(command[len("RUN:"):].strip())
+            if body is None:
+                return "ERROR:UNKNOWN_MACRO"
+            self.events = self.run(body)
+            return "OK:RAN"
+        return "ERROR:UNKNOWN_COMMAND"
+
+    def run(self, body):
+        """
+        Execute a macro body on a simulated clock.
+
+        Returns:
+            List of (time_ms, action, arg) events; action is "press", "release",
+            "type" (one per character) or "release_all"
+        """
+        events = []
+        t = 0
+        for op, arg in decode(body):
+            if op == "wait":
+                t += arg
+            elif op == "text":
+                for char in arg:
+                    events.append((t, "type", char))
+                    t += self.text_delay_ms
+            elif op == "key":
+                events.append((t, "press", arg))
+                events.append((t, "release", arg))
+            elif op == "release_all":
+                events.append((t, "release_all", None))
+            else:
+                events.append((t, op, arg))
+        events.append((t, "release_all", None))
+        return events
@@ -0,0 +1,556 @@
+"""
+Bighead Connection Supervisor
+
+Keeps a Bighead connection alive across USB disconnects and ESP32 resets.
+Disconnects are detected from serial errors, missing responses, and a device
+watcher (udev events when pyudev is installed, port polling otherwise). The
+same device is found again by USB serial number, held keys are cleared with
+RELEASEALL, and commands issued while offline are replayed or dropped
+according to a staleness policy.
+"""
+
+import sys
+import threading
+import time
+from collections import deque
+
+import serial
+import serial.tools.list_ports
+
+from bighead import Bighead, track_held
+from macros import MacroCommands
+
+
+# What to do with commands issued while the device is offline:
+#   drop   - buffer them, but discard any older than max_age at replay time
+#   replay - buffer them and replay all of them, however old
+#   fail   - raise ConnectionError immediately
+STALE_POLICIES = ("drop", "replay", "fail")
+
+# Recovery times kept for the metrics summary
+RECOVERY_HISTORY = 50
+
+# Seconds to let a stray status line arrive before flushing it
+FLUSH_WAIT = 0.02
+
+
+class DeviceWatcher:
+    """
+    Watches for a USB serial device appearing or disappearing.
+
+    Uses udev events via pyudev on Linux when available, otherwise polls the
+    serial port list.
+    """
+
+    def __init__(self, on_change, serial_number=None, port=None, poll_interval=0.05):
+        """
+        Initialize the watcher.
+
+        Args:
+            on_change: Callback(port) with the device port, or None when it is gone
+            serial_number: USB serial number to watch
+            port: Port name to watch when the device has no serial number
+            poll_interval: Seconds between polls when udev is unavailable
+        """
+        self.on_change = on_change
+        self.serial_number = serial_number
+        self.port = port
+        self.poll_interval = poll_interval
+        self._present = None
+        self._running = False
+        self._thread = None
+        self._observer = None
+
+    def find(self):
+        """Return the port of the watched device, or None if it is not present."""
+        for p in serial.tools.list_ports.comports():
+            if self.serial_number is not None:
+                if p.serial_number == self.serial_number:
+                    return p.device
+            elif p.device == self.port:
+                return p.device
+        return None
+
+    def _update(self, port):
+        """Report a presence change to the callback."""
+        if port != self._present:
+            self._present = port
+            self.on_change(port)
+
+    def _poll(self):
+        """Background polling loop."""
+        while self._running:
+            self._update(self.find())
+            time.sleep(self.poll_interval)
+
+    def _on_udev_event(self, device):
+        """Handle a udev tty event."""
+        if device.action not in ("add", "remove"):
+            return
+        if self.serial_number is not None:
+            if device.get("ID_SERIAL_SHORT") != self.serial_number:
+                return
+        elif device.device_node != self.port:
+            return
+        self._update(device.device_node if device.action == "add" else None)
+
+    def start(self):
+        """Start watching."""
+        self._running = True
+        self._present = self.find()
+        if sys.platform.startswith("linux"):
+            try:
+                import pyudev
+                context = pyudev.Context()
+                monitor = pyudev.Monitor.from_netlink(context)
+                monitor.filter_by(subsystem="tty")
+                self._observer = pyudev.MonitorObserver(
+                    monitor, callback=self._on_udev_event, daemon=True)
+                self._observer.start()
+                return self
+            except ImportError:
+                pass
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop watching."""
+        self._running = False
+        if self._observer:
+            self._observer.stop()
+            self._observer = None
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+
+class _PendingCommand:
+    """A command waiting for the device to come back."""
+
+    def __init__(self, cmd, timeout):
+        self.cmd = cmd
+        self.timeout = timeout
+        self.queued_at = time.monotonic()
+        self.response = None
+        self.error = None
+        self.done = threading.Event()
+
+    def finish(self, response=None, error=None):
+        self.response = response
+        self.error = error
+        self.done.set()
+
+
+class SupervisedBighead(MacroCommands):
+    """
+    Bighead connection that survives unplugs and resets.
+
+    Exposes the same command methods as Bighead. While the device is offline,
+    commands are buffered and the calling thread waits until they are
+    replayed or dropped as stale.
+    """
+
+    def __init__(self, port=None, baud=115200, serial_number=None, timeout=2.0,
+                 max_age=1.0, stale_policy="drop", block=True, poll_interval=0.05):
+        """
+        Initialize the supervised connection.
+
+        Args:
+            port: Serial port for the first connection (auto-detected if None)
+            baud: Baud rate
+            serial_number: USB serial number of the device (read from the port if None)
+            timeout: Seconds to wait for a command response
+            max_age: Seconds a buffered command stays fresh under the "drop" policy
+            stale_policy: "drop", "replay" or "fail" (see STALE_POLICIES)
+            block: If False, buffered commands return "QUEUED" instead of waiting
+            poll_interval: Seconds between reconnect attempts and port polls
+        """
+        if stale_policy not in STALE_POLICIES:
+            raise ValueError(f"stale_policy must be one of {STALE_POLICIES}")
+        self.port = port
+        self.baud = baud
+        self.serial_number = serial_number
+        self.timeout = timeout
+        self.max_age = max_age
+        self.stale_policy = stale_policy
+        self.block = block
+        self.poll_interval = poll_interval
+        self.macro_bodies = {}  # Macro id -> body, for RUN timeouts
+
+        self._bighead = None
+        self._online = False
+        self._running = False
+        self._down_since = None
+        self._pending = deque()
+        self._held = set()
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._reconnect_thread = None
+        self._watcher = None
+
+        self._metrics = {
+            "disconnects": 0,
+            "reconnects": 0,
+            "replayed": 0,
+            "dropped": 0,
+            "released_keys": 0,
+        }
+        self._recovery_ms = deque(maxlen=RECOVERY_HISTORY)
+
+    @property
+    def connected(self):
+        """Check if the device is currently online."""
+        return self._online
+
+    @property
+    def text_delay_ms(self):
+        """Per-character TEXT delay of the current connection."""
+        return self._bighead.text_delay_ms if self._bighead else None
+
+    def connect(self):
+        """
+        Connect to the device and start supervising it.
+
+        Returns:
+            self for method chaining
+
+        Raises:
+            ConnectionError: If the device cannot be found for the first connection
+        """
+        bh = Bighead(self.port, self.baud, self.timeout, self.serial_number)
+        bh.connect()
+        self.port = bh.port
+        self.serial_number = bh.serial_number
+        self._bighead = bh
+        self._online = True
+        self._running = True
+
+        self._watcher = DeviceWatcher(
+            self._on_device_change, self.serial_number, self.port, self.poll_interval)
+        self._watcher.start()
+        self._reconnect_thread = threading.Thread(target=self._reconnect_loop, daemon=True)
+        self._reconnect_thread.start()
+        return self
+
+    def disconnect(self):
+        """Stop supervising, fail buffered commands, and release all keys."""
+        self._running = False
+        self._wake.set()
+        if self._watcher:
+            self._watcher.stop()
+        if self._reconnect_thread:
+            self._reconnect_thread.join(timeout=2)
+        with self._lock:
+            while self._pending:
+                self._pending.popleft().finish(error="Supervisor stopped")
+            if self._bighead:
+                try:
+                    if self._online:
+                        self._bighead.disconnect()
+                    else:
+                        self._bighead.ser.close()
+                except (serial.SerialException, OSError, AttributeError):
+                    pass
+                self._bighead = None
+            self._online = False
+
+    def metrics(self):
+        """
+        Get connection health counters.
+
+        Returns:
+            Dict with disconnects, reconnects, replayed, dropped, released_keys,
+            pending, last_recovery_ms, mean_recovery_ms and max_recovery_ms
+        """
+        with self._lock:
+            result = dict(self._metrics)
+            result["pending"] = len(self._pending)
+            history = list(self._recovery_ms)
+        result["last_recovery_ms"] = history[-1] if history else None
+        result["mean_recovery_ms"] = sum(history) / len(history) if history else None
+        result["max_recovery_ms"] = max(history) if history else None
+        return result
+
+    def _mark_down(self):
+        """Take the connection offline and wake the reconnect loop."""
+        with self._lock:
+            if not self._online:
+                return
+            self._online = False
+            self._down_since = time.monotonic()
+            self._metrics["disconnects"] += 1
+            try:
+                self._bighead.ser.close()
+            except (serial.SerialException, OSError, AttributeError):
+                pass
+        self._wake.set()
+
+    def _on_device_change(self, port):
+        """Watcher callback: drop the link on unplug, reconnect on plug-in."""
+        if port is None:
+            bh = self._bighead
+            if self._online and bh is not None and hasattr(bh.ser, "cancel_read"):
+                bh.ser.cancel_read()  # Unblock a reader waiting on the dead port
+            self._mark_down()
+        self._wake.set()
+
+    def _try_send(self, cmd, timeout):
+        """
+        Send on the live connection.
+
+        Returns:
+            Response string ("" if the device is alive but the command timed
+            out), or None if the command could not be written and is safe to buffer
+
+        Raises:
+            ConnectionError: If the command was written but the device stopped
+                             responding. It is not buffered, since it may have run
+        """
+        bh = self._bighead
+        try:
+            bh.write(cmd)
+        except (serial.SerialException, OSError):
+            self._mark_down()
+            return None
+        try:
+            response = bh.read_response(timeout)
+        except (serial.SerialException, OSError):
+            response = None
+        if not response:
+            if response is None or not self._probe(bh):
+                self._mark_down()
+                raise ConnectionError(f"Bighead device stopped responding to {cmd}")
+            return ""
+        track_held(self._held, cmd)
+        return response
+
+    def _probe(self, bh):
+        """
+        Check with STATUS whether the device still answers after a timeout.
+
+        Late responses to the timed-out command are read and discarded, so
+        the next command is paired with its own response.
+
+        Returns:
+            True if the device answered
+        """
+        try:
+            bh.write("STATUS")
+            deadline = time.monotonic() + self.timeout
+            while time.monotonic() < deadline:
+                response = bh.read_response(deadline - time.monotonic())
+                if not response:
+                    return False
+                if response in ("OK:CONNECTED", "OK:DISCONNECTED"):
+                    self._flush(bh)
+                    return True
+        except (serial.SerialException, OSError):
+            pass
+        return False
+
+    @staticmethod
+    def _flush(bh):
+        """Discard a stray status line the firmware may print right after STATUS."""
+        time.sleep(FLUSH_WAIT)
+        bh.ser.reset_input_buffer()
+
+    def _wait_ble(self, bh):
+        """
+        Wait until the device reports its BLE link is up again.
+
+        Serial comes back before BLE after an ESP32 reset, and commands sent
+        in between fail with ERROR:NOT_CONNECTED.
+
+        Returns:
+            True once BLE is connected, False if the device went away or
+            the supervisor stopped
+        """
+        while self._running:
+            try:
+                response = bh.status()
+            except (serial.SerialException, OSError):
+                return False
+            if response == "OK:CONNECTED":
+                self._flush(bh)
+                return True
+            with self._lock:
+                self._expire_stale()
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+        return False
+
+    def _release_all(self, bh):
+        """
+        Release every key on a reconnected device.
+
+        Returns:
+            True if the device confirmed with OK:RELEASED
+        """
+        try:
+            response = bh.release_all()
+        except (serial.SerialException, OSError):
+            return False
+        if response != "OK:RELEASED":
+            print(f"[Supervisor] RELEASEALL after reconnect failed: {response or 'no response'}")
+            return False
+        return True
+
+    def _expire_stale(self):
+        """Drop buffered commands that are too old to replay."""
+        if self.stale_policy != "drop":
+            return
+        now = time.monotonic()
+        while self._pending and now - self._pending[0].queued_at > self.max_age:
+            self._pending.popleft().finish(error="Command dropped: device offline too long")
+            self._metrics["dropped"] += 1
+
+    def _reconnect_loop(self):
+        """Background thread that restores the connection and replays commands."""
+        while self._running:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if not self._running or self._online:
+                continue
+
+            with self._lock:
+                self._expire_stale()
+
+            port = Bighead.find_port(self.serial_number) if self.serial_number \
+                else self._watcher.find()
+            if port is None:
+                continue
+
+            bh = Bighead(port, self.baud, self.timeout, self.serial_number, settle=0)
+            bh.text_delay_ms = self._bighead.text_delay_ms  # Restored by connect()
+            try:
+                bh.connect()
+            except (ConnectionError, serial.SerialException, OSError):
+                continue
+            # connect()'s own RELEASEALL goes out before BLE is back and is
+            # rejected, so keys held before the drop are released here
+            if not (self._wait_ble(bh) and self._release_all(bh)):
+                try:
+                    bh.ser.close()
+                except (serial.SerialException, OSError):
+                    pass
+                continue
+
+            with self._lock:
+                self._bighead = bh
+                self.port = port
+                self._metrics["released_keys"] += len(self._held)
+                self._held.clear()
+                self._expire_stale()
+                self._online = True
+
+                while self._pending and self._online:
+                    entry = self._pending[0]
+                    try:
+                        response = self._try_send(entry.cmd, entry.timeout)
+                    except ConnectionError as e:
+                        self._pending.popleft().finish(error=str(e))
+                        break
+                    if response is None:
+                        break
+                    self._pending.popleft().finish(response)
+                    self._metrics["replayed"] += 1
+
+                if self._online:
+                    self._metrics["reconnects"] += 1
+                    self._recovery_ms.append((time.monotonic() - self._down_since) * 1000)
+                    self._down_since = None
+
+    def send(self, cmd, timeout=None):
+        """
+        Send a raw command, buffering it if the device is offline.
+
+        Args:
+            cmd: Command string (e.g., "KEY:ENTER", "TEXT:hello")
+            timeout: Seconds to wait for the response (default: self.timeout)
+
+        Returns:
+            Response string from device, or "QUEUED" when buffered and block=False
+
+        Raises:
+            ConnectionError: If the command fails under the "fail" policy,
+                             is dropped as stale, was written but never answered,
+                             or the supervisor stops
+        """
+        if timeout is None:
+            timeout = self.timeout
+        with self._lock:
+            if self._online:
+                response = self._try_send(cmd, timeout)
+                if response is not None:
+                    return response
+            if not self._running:
+                raise ConnectionError("Not connected to Bighead device")
+            if self.stale_policy == "fail":
+                raise ConnectionError("Bighead device disconnected")
+            entry = _PendingCommand(cmd, timeout)
+            self._pending.append(entry)
+        self._wake.set()
+
+        if not self.block:
+            return "QUEUED"
+        entry.done.wait()
+        if entry.error:
+            raise ConnectionError(entry.error)
+        return entry.response
+
+    def key(self, key_name):
+        """Press and release a key."""
+        return self.send(f"KEY:{key_name}")
+
+    def press(self, key_name):
+        """Press and hold a key."""
+        return self.send(f"PRESS:{key_name}")
+
+    def release(self, key_name):
+        """Release a held key."""
+        return self.send(f"RELEASE:{key_name}")
+
+    def release_all(self):
+        """Release all held keys."""
+        return self.send("RELEASEALL")
+
+    def text(self, content):
+        """Type text string."""
+        typing_time = len(content) * (self.text_delay_ms or 0) / 1000
+        return self.send(f"TEXT:{content}", timeout=self.timeout + typing_time)
+
+    def rate(self, ms):
+        """Set the per-character TEXT delay on the device (1-1000 ms)."""
+        response = self.send(f"RATE:{int(ms)}")
+        if response == "OK:RATE_SET" and self._bighead:
+            self._bighead.text_delay_ms = int(ms)
+        return response
+
+    def delay(self, ms):
+        """Wait for specified milliseconds on device."""
+        return self.send(f"DELAY:{ms}", timeout=self.timeout + ms / 1000)
+
+    def status(self):
+        """Check BLE connection status."""
+        return self.send("STATUS")
+
+    def __enter__(self):
+        """Context manager support."""
+        return self.connect()
+
+    def __exit__(self, *args):
+        """Context manager cleanup."""
+        self.disconnect()
+
+
+if __name__ == "__main__":
+    with SupervisedBighead() as bh:
+        print(f"Supervising {bh.port} (serial {bh.serial_number})")
+        print("Unplug and replug the device to test recovery. Ctrl+C to stop.")
+        try:
+            while True:
+                print(f"Status: {bh.status()}  Metrics: {bh.metrics()}")
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
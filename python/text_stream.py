@@ -0,0 +1,304 @@
+"""
+Bighead Text Streaming
+
+Types arbitrarily large text (strings, files, generators) through the ESP32.
+Text is split into chunks that fit the firmware line buffer and pipelined,
+so the next chunk is already waiting in the device's receive buffer when the
+current one finishes. The per-character delay adapts to observed ack timing.
+
+Only ASCII is typed: BleKeyboard sends bytes 136 and up as raw keycodes, so
+UTF-8 text would press function and navigation keys. Other characters are
+replaced (with "?" by default).
+"""
+
+import threading
+import time
+from collections import deque
+
+from bighead import (
+    DEFAULT_TEXT_DELAY_MS,
+    MAX_LINE_LENGTH,
+    MAX_TEXT_DELAY_MS,
+    MIN_TEXT_DELAY_MS,
+)
+
+
+# Largest TEXT payload, in bytes, that fits the firmware line buffer
+MAX_CHUNK_SIZE = MAX_LINE_LENGTH - len("TEXT:") - 1
+
+# ESP32 UART receive buffer; bytes in flight must fit in it
+DEVICE_RX_BUFFER = 256
+
+# Lines the firmware prints by itself when the BLE link changes state
+UNSOLICITED = ("OK:CONNECTED", "OK:DISCONNECTED")
+
+# Chunks shorter than this are too noisy to drive rate control
+MIN_OBSERVED_CHARS = 8
+
+
+class RateController:
+    """
+    AIMD controller for the per-character TEXT delay.
+
+    Each acked chunk reports how long the device took per character. Time
+    beyond the configured delay is spent pushing HID reports over BLE. While
+    that overhead stays near the lowest value seen, the delay is lowered by
+    `step_ms`; when it grows (the BLE link is congested) the delay is
+    multiplied by `backoff`.
+    """
+
+    def __init__(self, delay_ms=DEFAULT_TEXT_DELAY_MS, min_ms=10, max_ms=100,
+                 step_ms=1, backoff=1.5, tolerance_ms=2.0):
+        """
+        Initialize the controller.
+
+        Args:
+            delay_ms: Starting per-character delay
+            min_ms: Lowest delay the controller will try
+            max_ms: Highest delay the controller will back off to
+            step_ms: Additive decrease per uncongested chunk
+            backoff: Multiplicative increase on congestion
+            tolerance_ms: Per-character overhead above baseline that counts as congestion
+        """
+        self.min_ms = max(MIN_TEXT_DELAY_MS, min_ms)
+        self.max_ms = min(MAX_TEXT_DELAY_MS, max_ms)
+        self.step_ms = step_ms
+        self.backoff = backoff
+        self.tolerance_ms = tolerance_ms
+        self.delay_ms = min(max(int(delay_ms), self.min_ms), self.max_ms)
+        self._baseline = None
+
+    def observe(self, chars, elapsed, delay_ms):
+        """
+        Feed the timing of one acked chunk.
+
+        Args:
+            chars: Characters in the chunk
+            elapsed: Seconds the device spent typing it
+            delay_ms: Delay that was in effect for the chunk
+
+        Returns:
+            The delay to use for the next chunk
+        """
+        if chars < MIN_OBSERVED_CHARS:
+            return self.delay_ms
+
+        overhead = elapsed * 1000 / chars - delay_ms
+        if self._baseline is None or overhead < self._baseline:
+            self._baseline = max(overhead, 0.0)
+
+        if overhead > self._baseline + self.tolerance_ms:
+            self.delay_ms = min(self.max_ms, int(self.delay_ms * self.backoff + 0.5))
+        else:
+            self.delay_ms = max(self.min_ms, self.delay_ms - self.step_ms)
+        return self.delay_ms
+
+
+class TextStreamer:
+    """Pipelined, cancellable text typing over a Bighead connection."""
+
+    def __init__(self, bighead, chunk_size=64, depth=2, adaptive=True,
+                 controller=None, on_progress=None, non_ascii="?"):
+        """
+        Initialize the streamer.
+
+        Args:
+            bighead: Connected Bighead instance
+            chunk_size: Bytes of text per TEXT command (max 250)
+            depth: Commands allowed in flight at once
+            adaptive: Adjust the typing delay from ack timing
+            controller: RateController to use (created from the device rate if None)
+            on_progress: Callback(typed_chars, total_chars); total is None for streams
+            non_ascii: ASCII text typed in place of each non-ASCII character
+                       ("" to drop them)
+
+        Raises:
+            ValueError: If chunk_size is out of range or non_ascii is not ASCII
+        """
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}")
+        if not non_ascii.isascii() or "\n" in non_ascii or "\r" in non_ascii:
+            raise ValueError("non_ascii must be single-line ASCII text")
+        self.bighead = bighead
+        self.chunk_size = chunk_size
+        self.depth = max(1, depth)
+        self.adaptive = adaptive
+        self.controller = controller
+        self.on_progress = on_progress
+        self.non_ascii = non_ascii
+        self._replaced = 0
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """Stop after the chunks already sent to the device have been typed."""
+        self._cancel.set()
+
+    def _pieces(self, source):
+        """Yield string pieces from a str, file-like object, or iterable of str."""
+        if isinstance(source, str):
+            yield source
+        elif hasattr(source, "read"):
+            while True:
+                data = source.read(4096)
+                if not data:
+                    return
+                yield data
+        else:
+            for piece in source:
+                yield piece
+
+    def _to_ascii(self, text):
+        """Replace characters the device can't type, counting them."""
+        if text.isascii():
+            return text
+        self._replaced += sum(1 for c in text if not c.isascii())
+        return "".join(c if c.isascii() else self.non_ascii for c in text)
+
+    def _commands(self, source):
+        """
+        Yield (command, chars) pairs, turning newlines into ENTER keys.
+
+        Text is ASCII by then, so each chunk's byte length equals its
+        character count.
+        """
+        chunk = ""
+        for piece in self._pieces(source):
+            piece = self._to_ascii(piece)
+            for line_no, line in enumerate(piece.replace("\r", "").split("\n")):
+                if line_no > 0:
+                    if chunk:
+                        yield f"TEXT:{chunk}", len(chunk)
+                        chunk = ""
+                    yield "KEY:ENTER", 1
+                while line:
+                    room = self.chunk_size - len(chunk)
+                    chunk += line[:room]
+                    line = line[room:]
+                    if len(chunk) == self.chunk_size:
+                        yield f"TEXT:{chunk}", len(chunk)
+                        chunk = ""
+        if chunk:
+            yield f"TEXT:{chunk}", len(chunk)
+
+    def _read_ack(self, chars, delay_ms):
+        """Read the response for the oldest in-flight command."""
+        typing_time = chars * delay_ms / 1000
+        deadline = time.monotonic() + self.bighead.timeout + 2 * typing_time
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return ""
+            response = self.bighead.read_response(timeout=remaining)
+            if response not in UNSOLICITED:
+                return response
+
+    def type(self, source, cancel=None):
+        """
+        Type text from a string, file-like object, or iterable of strings.
+
+        Blocks until everything is typed, an error occurs, or the stream is
+        cancelled. Chunks already sent to the device are always finished,
+        then all keys are released.
+
+        Args:
+            source: Text to type
+            cancel: Optional threading.Event that cancels the stream when set
+
+        Returns:
+            Dict with typed, chunks, elapsed, chars_per_sec, delay_ms,
+            replaced (non-ASCII characters substituted), cancelled and error
+            (the device response that stopped the stream)
+        """
+        bh = self.bighead
+        self._cancel.clear()
+        self._replaced = 0
+        total = None
+        if isinstance(source, str):
+            source = self._to_ascii(source)
+            total = len(source.replace("\r", ""))
+        initial_delay = bh.text_delay_ms
+        if self.controller is None:
+            self.controller = RateController(initial_delay)
+        device_delay = initial_delay
+
+        commands = self._commands(source)
+        inflight = deque()  # (cmd, chars, delay_ms, n_bytes)
+        inflight_bytes = 0
+        pending = None
+        typed = chunks = 0
+        error = None
+        last_ack = start = time.monotonic()
+
+        def cancelled():
+            return self._cancel.is_set() or (cancel is not None and cancel.is_set())
+
+        while True:
+            if pending is None and error is None and not cancelled():
+                pending = next(commands, None)
+
+            if pending is not None and error is None and not cancelled():
+                cmd, chars = pending
+                # A rate change rides along with the TEXT it applies to
+                rate_cmd = None
+                if (self.adaptive and cmd.startswith("TEXT:")
+                        and self.controller.delay_ms != device_delay):
+                    rate_cmd = f"RATE:{self.controller.delay_ms}"
+                cmd_bytes = len(cmd.encode()) + 1
+                rate_bytes = len(rate_cmd.encode()) + 1 if rate_cmd else 0
+                n_bytes = cmd_bytes + rate_bytes
+                if len(inflight) < self.depth and (
+                        not inflight or inflight_bytes + n_bytes <= DEVICE_RX_BUFFER):
+                    if rate_cmd:
+                        bh.write(rate_cmd)
+                        device_delay = self.controller.delay_ms
+                        inflight.append((rate_cmd, 0, device_delay, rate_bytes))
+                    bh.write(cmd)
+                    inflight.append((cmd, chars, device_delay, cmd_bytes))
+                    inflight_bytes += n_bytes
+                    pending = None
+                    continue
+
+            if not inflight:
+                break
+
+            cmd, chars, delay_ms, n_bytes = inflight.popleft()
+            inflight_bytes -= n_bytes
+            response = self._read_ack(chars, delay_ms)
+            now = time.monotonic()
+
+            if not response:
+                # Acks still on the way can't be paired with commands anymore;
+                # let the device finish, then throw away whatever it sent
+                error = error or "TIMEOUT"
+                time.sleep(sum(c * d for _, c, d, _ in inflight) / 1000 + bh.timeout)
+                inflight.clear()
+                bh.ser.reset_input_buffer()
+                break
+            if not response.startswith("OK:"):
+                error = error or response
+            elif cmd.startswith("RATE:"):
+                bh.text_delay_ms = delay_ms
+            else:
+                typed += chars
+                chunks += 1
+                if self.adaptive and cmd.startswith("TEXT:"):
+                    self.controller.observe(chars, now - last_ack, delay_ms)
+                if self.on_progress:
+                    self.on_progress(typed, total)
+            last_ack = now
+
+        if device_delay != initial_delay or bh.text_delay_ms != initial_delay:
+            bh.rate(initial_delay)
+        bh.release_all()
+
+        elapsed = time.monotonic() - start
+        return {
+            "typed": typed,
+            "chunks": chunks,
+            "elapsed": elapsed,
+            "chars_per_sec": typed / elapsed if elapsed > 0 else 0.0,
+            "delay_ms": self.controller.delay_ms,
+            "replaced": self._replaced,
+            "cancelled": cancelled(),
+            "error": error,
+        }
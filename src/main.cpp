@@ -1,5 +1,6 @@
 #include <Arduino.h>
 #include <BleKeyboard.h>
+#include <Preferences.h>
 
 // Initialize BLE Keyboard with device name, manufacturer, and battery level
 BleKeyboard bleKeyboard("Bighead", "Bighead", 100);
@@ -7,8 +8,21 @@ BleKeyboard bleKeyboard("Bighead", "Bighead", 100);
 // Buffer for incoming serial commands
 String inputBuffer = "";
 String originalBuffer = "";  // Preserve original case for TEXT command
+String rawBuffer = "";       // Untrimmed line, so TEXT keeps edge whitespace
 const int MAX_BUFFER_SIZE = 256;
 
+// Per-character typing delay for TEXT (adjustable with RATE:ms)
+const int DEFAULT_TEXT_DELAY_MS = 25;
+const int MIN_TEXT_DELAY_MS = 1;
+const int MAX_TEXT_DELAY_MS = 1000;
+int textDelayMs = DEFAULT_TEXT_DELAY_MS;
+
+// Macros stored in NVS: key "m<ID>" holds the body, "_index" the id list
+Preferences macroStore;
+const int MAX_MACRO_ID_LENGTH = 12;  // NVS keys are limited to 15 characters
+const int MAX_MACROS = 64;
+const int MAX_WAIT_MS = 10000;
+
 // Track connection state for automatic status reporting
 bool wasConnected = false;
 
@@ -20,6 +34,15 @@ void handlePressCommand(String keyName);
 void handleReleaseCommand(String keyName);
 void handleMediaCommand(String action);
 void handleStatusCommand();
+void handleRateCommand(String value);
+void handleMacroCommand(String args, String rawArgs);
+void handleMacroListCommand();
+void handleMacroHashCommand(String id);
+void handleMacroDeleteCommand(String id);
+void handleRunCommand(String id);
+bool runMacro(const String& body, bool execute);
+bool runMacroStep(String step, bool execute);
+void typeText(const String& text);
 void handleRawCommand(String code);
 void handleRawPressCommand(String code);
 void handleRawReleaseCommand(String code);
@@ -39,6 +62,9 @@ void setup() {
     // Start BLE Keyboard
     bleKeyboard.begin();
 
+    // Open macro storage (read-write)
+    macroStore.begin("macros", false);
+
     Serial.println("OK:READY");
     Serial.println("Waiting for Bluetooth connection...");
 }
@@ -62,12 +88,14 @@ void loop() {
         if (c == '\n' || c == '\r') {
             // Process command when newline received
             if (inputBuffer.length() > 0) {
+                rawBuffer = inputBuffer;
                 inputBuffer.trim();
                 originalBuffer = inputBuffer;  // Save original case
                 inputBuffer.toUpperCase();
                 processCommand(inputBuffer);
                 inputBuffer = "";
                 originalBuffer = "";
+                rawBuffer = "";
             }
         } else {
             // Add character to buffer if not exceeding max size
@@ -88,8 +116,9 @@ void processCommand(String command) {
             Serial.println("ERROR:NOT_CONNECTED");
             return;
         }
-        // Use originalBuffer to preserve case for text typing
-        handleTextCommand(originalBuffer.substring(5));
+        // Use rawBuffer to preserve case and leading/trailing spaces, so
+        // text streamed in chunks keeps the whitespace at chunk boundaries
+        handleTextCommand(rawBuffer.substring(rawBuffer.indexOf(':') + 1));
     }
     else if (command.startsWith("KEY:")) {
         if (!bleKeyboard.isConnected()) {
@@ -159,6 +188,30 @@ void processCommand(String command) {
             Serial.println("ERROR:INVALID_DELAY");
         }
     }
+    else if (command.startsWith("MACRO:")) {
+        // Body comes from rawBuffer so TEXT steps keep their case
+        handleMacroCommand(command.substring(6), rawBuffer.substring(rawBuffer.indexOf(':') + 1));
+    }
+    else if (command == "MACROS") {
+        handleMacroListCommand();
+    }
+    else if (command.startsWith("MACROHASH:")) {
+        handleMacroHashCommand(command.substring(10));
+    }
+    else if (command.startsWith("MACRODEL:")) {
+        handleMacroDeleteCommand(command.substring(9));
+    }
+    else if (command.startsWith("RUN:")) {
+        if (!bleKeyboard.isConnected()) {
+            Serial.println("ERROR:NOT_CONNECTED");
+            return;
+        }
+        handleRunCommand(command.substring(4));
+    }
+    else if (command.startsWith("RATE:")) {
+        // RATE can be set even when not connected
+        handleRateCommand(command.substring(5));
+    }
     else if (command == "STATUS") {
         handleStatusCommand();
     }
@@ -170,12 +223,16 @@ void processCommand(String command) {
     }
 }
 
-void handleTextCommand(String text) {
+void typeText(const String& text) {
     // Send characters one at a time with small delay to prevent BLE buffer issues
     for (unsigned int i = 0; i < text.length(); i++) {
         bleKeyboard.print(text[i]);
-        delay(25);  // 25ms delay = 40 chars/sec
+        delay(textDelayMs);  // 25ms default = 40 chars/sec
     }
+}
+
+void handleTextCommand(String text) {
+    typeText(text);
     bleKeyboard.releaseAll();  // Ensure no keys stuck
     Serial.println("OK:TYPED");
 }
@@ -236,6 +293,219 @@ void handleStatusCommand() {
     }
 }
 
+void handleRateCommand(String value) {
+    value.trim();
+    int delayMs = value.toInt();
+
+    if (delayMs >= MIN_TEXT_DELAY_MS && delayMs <= MAX_TEXT_DELAY_MS) {
+        textDelayMs = delayMs;
+        Serial.println("OK:RATE_SET");
+    } else {
+        Serial.println("ERROR:INVALID_RATE");
+    }
+}
+
+bool isValidMacroId(const String& id) {
+    if (id.length() == 0 || id.length() > MAX_MACRO_ID_LENGTH) {
+        return false;
+    }
+    for (unsigned int i = 0; i < id.length(); i++) {
+        char c = id.charAt(i);
+        if (!((c >= 'A' && c <= 'Z') || (c >= '0' && c <= '9') || c == '_')) {
+            return false;
+        }
+    }
+    return true;
+}
+
+bool macroIndexContains(const String& index, const String& id) {
+    return ("," + index + ",").indexOf("," + id + ",") >= 0;
+}
+
+int macroIndexCount(const String& index) {
+    if (index.length() == 0) {
+        return 0;
+    }
+    int count = 1;
+    for (unsigned int i = 0; i < index.length(); i++) {
+        if (index.charAt(i) == ',') {
+            count++;
+        }
+    }
+    return count;
+}
+
+// Run (or just validate, when execute is false) one macro step
+bool runMacroStep(String step, bool execute) {
+    if (step.length() == 0) {
+        return false;
+    }
+    char op = toupper(step.charAt(0));
+    String arg = step.substring(1);
+
+    if (op == 'T') {
+        if (execute) typeText(arg);
+        return true;
+    }
+
+    arg.trim();
+    arg.toUpperCase();
+
+    if (op == 'A') {
+        if (arg.length() > 0) return false;
+        if (execute) bleKeyboard.releaseAll();
+        return true;
+    }
+    if (op == 'W') {
+        for (unsigned int i = 0; i < arg.length(); i++) {
+            if (!isDigit(arg.charAt(i))) return false;
+        }
+        int waitMs = arg.toInt();
+        if (waitMs <= 0 || waitMs > MAX_WAIT_MS) return false;
+        if (execute) delay(waitMs);
+        return true;
+    }
+
+    uint8_t keyCode = getKeyCode(arg);
+    if (keyCode == 0) {
+        return false;
+    }
+    if (op == 'P') {
+        if (execute) bleKeyboard.press(keyCode);
+        return true;
+    }
+    if (op == 'R') {
+        if (execute) bleKeyboard.release(keyCode);
+        return true;
+    }
+    if (op == 'K') {
+        if (execute) bleKeyboard.write(keyCode);
+        return true;
+    }
+    return false;
+}
+
+// Steps are separated by '|'; validation and playback share this parser
+bool runMacro(const String& body, bool execute) {
+    if (body.length() == 0) {
+        return false;
+    }
+    int start = 0;
+    while (true) {
+        int end = body.indexOf('|', start);
+        String step = (end < 0) ? body.substring(start) : body.substring(start, end);
+        if (!runMacroStep(step, execute)) {
+            return false;
+        }
+        if (end < 0) {
+            break;
+        }
+        start = end + 1;
+    }
+    if (execute) {
+        bleKeyboard.releaseAll();  // Ensure no keys stuck
+    }
+    return true;
+}
+
+void handleMacroCommand(String args, String rawArgs) {
+    int sep = args.indexOf(':');
+    if (sep < 0) {
+        Serial.println("ERROR:INVALID_MACRO_ID");
+        return;
+    }
+    String id = args.substring(0, sep);
+    String body = rawArgs.substring(rawArgs.indexOf(':') + 1);
+
+    if (!isValidMacroId(id)) {
+        Serial.println("ERROR:INVALID_MACRO_ID");
+        return;
+    }
+    if (!runMacro(body, false)) {
+        Serial.println("ERROR:INVALID_MACRO");
+        return;
+    }
+
+    String index = macroStore.getString("_index", "");
+    bool isNew = !macroIndexContains(index, id);
+    if (isNew && macroIndexCount(index) >= MAX_MACROS) {
+        Serial.println("ERROR:MACRO_STORAGE_FULL");
+        return;
+    }
+    if (macroStore.putString(("m" + id).c_str(), body) == 0) {
+        Serial.println("ERROR:MACRO_STORAGE_FULL");
+        return;
+    }
+    if (isNew) {
+        if (index.length() > 0) index += ",";
+        index += id;
+        macroStore.putString("_index", index);
+    }
+    Serial.println("OK:MACRO_SAVED");
+}
+
+void handleMacroListCommand() {
+    Serial.println("OK:MACROS:" + macroStore.getString("_index", ""));
+}
+
+void handleMacroHashCommand(String id) {
+    id.trim();
+    String key = "m" + id;
+    if (!isValidMacroId(id) || !macroStore.isKey(key.c_str())) {
+        Serial.println("ERROR:UNKNOWN_MACRO");
+        return;
+    }
+    String body = macroStore.getString(key.c_str(), "");
+
+    // FNV-1a 32-bit, matches macros.macro_hash() in the Python SDK
+    uint32_t hash = 0x811C9DC5;
+    for (unsigned int i = 0; i < body.length(); i++) {
+        hash ^= (uint8_t)body.charAt(i);
+        hash *= 0x01000193;
+    }
+    char hex[9];
+    snprintf(hex, sizeof(hex), "%08x", hash);
+    Serial.println("OK:HASH:" + String(hex));
+}
+
+void handleMacroDeleteCommand(String id) {
+    id.trim();
+    String key = "m" + id;
+    if (!isValidMacroId(id) || !macroStore.isKey(key.c_str())) {
+        Serial.println("ERROR:UNKNOWN_MACRO");
+        return;
+    }
+    macroStore.remove(key.c_str());
+
+    // Rebuild the index without this id
+    String index = macroStore.getString("_index", "");
+    String remaining = "";
+    int start = 0;
+    while (start <= (int)index.length()) {
+        int end = index.indexOf(',', start);
+        if (end < 0) end = index.length();
+        String entry = index.substring(start, end);
+        if (entry.length() > 0 && entry != id) {
+            if (remaining.length() > 0) remaining += ",";
+            remaining += entry;
+        }
+        start = end + 1;
+    }
+    macroStore.putString("_index", remaining);
+    Serial.println("OK:MACRO_DELETED");
+}
+
+void handleRunCommand(String id) {
+    id.trim();
+    String key = "m" + id;
+    if (!isValidMacroId(id) || !macroStore.isKey(key.c_str())) {
+        Serial.println("ERROR:UNKNOWN_MACRO");
+        return;
+    }
+    runMacro(macroStore.getString(key.c_str(), ""), true);
+    Serial.println("OK:RAN");
+}
+
 void handleRawCommand(String code) {
     code.trim();
     uint8_t scanCode;
@@ -0,0 +1,255 @@
+"""
+Tests for macro encoding, hashing, the firmware reference model, and the
+SDK macro methods running against it.
+
+Usage:
+    pip install pytest pyserial
+    python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "python"))
+
+import macros
+from bighead import Bighead
+from macros import MacroModel
+
+
+STEPS = [
+    ("press", "CTRL"),
+    ("key", "V"),
+    ("release", "CTRL"),
+    ("wait", 50),
+    ("text", "/e Dance"),
+    ("key", "ENTER"),
+    ("release_all", None),
+]
+
+
+class ModelSerial:
+    """Serial port stand-in that answers each command line with MacroModel."""
+
+    def __init__(self, model):
+        self.model = model
+        self.written = []
+        self._lines = []
+
+    def write(self, data):
+        for line in data.decode().splitlines():
+            self.written.append(line)
+            self._lines.append(self.model.handle(line) + "\r\n")
+
+    def readline(self):
+        return self._lines.pop(0).encode() if self._lines else b""
+
+    def reset_input_buffer(self):
+        self._lines = []
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def model():
+    return MacroModel()
+
+
+@pytest.fixture
+def bh(model):
+    device = Bighead(port="test", timeout=0.2)
+    device.ser = ModelSerial(model)
+    return device
+
+
+# Encoding
+
+def test_encode_decode_round_trip():
+    body = macros.encode(STEPS)
+    assert body == "PCTRL|KV|RCTRL|W50|T/e Dance|KENTER|A"
+    assert macros.decode(body) == STEPS
+
+
+def test_decode_normalizes_key_case_but_keeps_text():
+    assert macros.decode("pctrl|k v|T/e Dance") == [
+        ("press", "CTRL"), ("key", "V"), ("text", "/e Dance")]
+
+
+@pytest.mark.parametrize("body", [
+    "",            # Empty
+    "X",           # Unknown op
+    "K",           # Missing key
+    "PNOPE",       # Unknown key
+    "W0",          # Wait too short
+    "W10001",      # Wait too long
+    "W+5",         # Not plain digits (the firmware rejects it too)
+    "W5ms",
+    "Aextra",      # release_all takes no argument
+    "KV||KV",      # Empty step
+])
+def test_decode_rejects_bad_steps(body):
+    with pytest.raises(ValueError):
+        macros.decode(body)
+
+
+@pytest.mark.parametrize("steps", [
+    [("jump", "A")],
+    [("text", "a|b")],
+    [("text", "line\nbreak")],
+    [("wait", 0)],
+    [("key", "NOPE")],
+])
+def test_encode_rejects_bad_steps(steps):
+    with pytest.raises(ValueError):
+        macros.encode(steps)
+
+
+def test_upload_command_limits():
+    assert macros.upload_command("paste", "KV") == "MACRO:PASTE:KV"
+    for bad_id in ("", "TOO_LONG_ID_13", "BAD-ID", "ÄÖ"):
+        with pytest.raises(ValueError):
+            macros.upload_command(bad_id, "KV")
+    with pytest.raises(ValueError):
+        macros.upload_command("X", "T" + "a" * macros.MAX_LINE_LENGTH)
+
+
+@pytest.mark.parametrize("body", [
+    "|".join(["W9999"] * 41),
+    "|".join(["W10000"] * 35),
+    "T" + "x" * (macros.MAX_BODY_LENGTH - 1),
+])
+def test_max_run_bounds_longest_bodies(body):
+    macros.upload_command("X", body)  # Fits in one line
+    assert macros.duration_ms(body, macros.MAX_TEXT_DELAY_MS) <= macros.MAX_RUN_MS
+
+
+# Hashing
+
+@pytest.mark.parametrize("body, expected", [
+    ("", "811c9dc5"),
+    ("a", "e40c292c"),
+    ("foobar", "bf9cf968"),
+])
+def test_hash_known_vectors(body, expected):
+    assert macros.macro_hash(body) == expected
+
+
+# Reference model
+
+def test_model_upload_list_hash_delete(model):
+    body = macros.encode(STEPS)
+    assert model.handle(f"MACRO:paste:{body}") == "OK:MACRO_SAVED"
+    assert model.handle("MACRO:DANCE:KENTER") == "OK:MACRO_SAVED"
+    assert model.handle("MACROS") == "OK:MACROS:PASTE,DANCE"
+    assert model.handle("MACROHASH:PASTE") == f"OK:HASH:{macros.macro_hash(body)}"
+
+    assert model.handle("MACRODEL:paste") == "OK:MACRO_DELETED"
+    assert model.handle("MACROS") == "OK:MACROS:DANCE"
+    assert model.handle("MACROHASH:PASTE") == "ERROR:UNKNOWN_MACRO"
+    assert model.handle("MACRODEL:PASTE") == "ERROR:UNKNOWN_MACRO"
+    assert model.handle("RUN:PASTE") == "ERROR:UNKNOWN_MACRO"
+
+
+def test_model_rejects_bad_uploads(model):
+    assert model.handle("MACRO:BAD ID:KV") == "ERROR:INVALID_MACRO_ID"
+    assert model.handle("MACRO:NOBODY") == "ERROR:INVALID_MACRO_ID"
+    assert model.handle("MACRO:X:W0") == "ERROR:INVALID_MACRO"
+    assert model.handle("MACROS") == "OK:MACROS:"
+
+
+def test_model_storage_full(model):
+    for i in range(macros.MAX_MACROS):
+        assert model.handle(f"MACRO:M{i}:KV") == "OK:MACRO_SAVED"
+    assert model.handle("MACRO:ONEMORE:KV") == "ERROR:MACRO_STORAGE_FULL"
+    assert model.handle("MACRO:M0:KENTER") == "OK:MACRO_SAVED"  # Overwrite is fine
+
+
+def test_model_run_requires_ble():
+    model = MacroModel(ble_connected=False)
+    model.handle("MACRO:X:KV")
+    assert model.handle("RUN:X") == "ERROR:NOT_CONNECTED"
+    assert model.events == []
+
+
+@pytest.mark.parametrize("text_delay_ms", [1, 25, 100])
+def test_model_run_timing_matches_duration(text_delay_ms):
+    model = MacroModel(text_delay_ms=text_delay_ms)
+    body = macros.encode(STEPS)
+    model.handle(f"MACRO:PASTE:{body}")
+    assert model.handle("RUN:PASTE") == "OK:RAN"
+
+    events = model.events
+    assert events[:4] == [
+        (0, "press", "CTRL"), (0, "press", "V"), (0, "release", "V"), (0, "release", "CTRL")]
+    typed = [(t, arg) for t, action, arg in events if action == "type"]
+    assert "".join(arg for _, arg in typed) == "/e Dance"
+    assert [t for t, _ in typed] == [50 + i * text_delay_ms for i in range(len(typed))]
+    # Every macro ends by releasing all keys, once the last step has finished
+    assert events[-1] == (macros.duration_ms(body, text_delay_ms), "release_all", None)
+
+
+# SDK over the model
+
+def test_bighead_upload_and_verify(bh, model):
+    assert bh.upload_macro("paste", STEPS) == "OK:MACRO_SAVED"
+    assert model.store["PASTE"] == macros.encode(STEPS)
+    assert bh.list_macros() == ["PASTE"]
+    assert bh.macro_hash("PASTE") == macros.macro_hash(macros.encode(STEPS))
+
+    assert bh.verify_macro("PASTE", STEPS)
+    assert not bh.verify_macro("PASTE", STEPS[:-1])
+    assert not bh.verify_macro("MISSING", STEPS)
+
+
+def test_bighead_upload_rejects_locally(bh):
+    with pytest.raises(ValueError):
+        bh.upload_macro("BAD-ID", STEPS)
+    assert bh.ser.written == []
+
+
+def test_bighead_run_waits_for_macro_duration(bh, model, monkeypatch):
+    timeouts = []
+    read_response = bh.read_response
+    monkeypatch.setattr(bh, "read_response",
+                        lambda timeout=None: timeouts.append(timeout) or read_response(timeout))
+
+    bh.upload_macro("PASTE", STEPS)
+    assert bh.run_macro("paste") == "OK:RAN"
+    duration = macros.duration_ms(macros.encode(STEPS), bh.text_delay_ms)
+    assert timeouts[-1] == pytest.approx(bh.timeout + duration / 1000)
+    assert model.events[-1][0] == duration
+
+
+def test_bighead_run_uses_current_rate(bh, model, monkeypatch):
+    timeouts = []
+    read_response = bh.read_response
+    monkeypatch.setattr(bh, "read_response",
+                        lambda timeout=None: timeouts.append(timeout) or read_response(timeout))
+
+    bh.upload_macro("PASTE", STEPS)
+    bh.text_delay_ms = 200  # As after rate(200)
+    bh.run_macro("PASTE")
+    duration = macros.duration_ms(macros.encode(STEPS), 200)
+    assert timeouts[-1] == pytest.approx(bh.timeout + duration / 1000)
+
+
+def test_bighead_run_unknown_duration_waits_for_longest(bh, model, monkeypatch):
+    model.handle("MACRO:OTHER:KV")  # Stored before a restart; body not known
+    timeouts = []
+    read_response = bh.read_response
+    monkeypatch.setattr(bh, "read_response",
+                        lambda timeout=None: timeouts.append(timeout) or read_response(timeout))
+
+    assert bh.run_macro("OTHER") == "OK:RAN"
+    assert timeouts[-1] == pytest.approx(bh.timeout + macros.MAX_RUN_MS / 1000)
+
+
+def test_bighead_delete_forgets_body(bh):
+    bh.upload_macro("PASTE", STEPS)
+    assert "PASTE" in bh.macro_bodies
+    assert bh.delete_macro("paste") == "OK:MACRO_DELETED"
+    assert "PASTE" not in bh.macro_bodies
+    assert bh.run_macro("PASTE") == "ERROR:UNKNOWN_MACRO"